@@ -0,0 +1,203 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import yaml
+import processing
+from processing import load_books, load_books_generic, get_dataset_files
+from generate_data import BASE_USERS, generate_dataset, generate_users, load_value_pools
+
+RESULTS_FILE = './benchmark_results.jsonl'
+
+
+def time_call(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def load_books_pure_yaml(yaml_file):
+    # loader used by import_data before the columnar books loader
+    with open(yaml_file, 'r') as f:
+        data = yaml.safe_load(f)
+    df_books = pd.DataFrame(data)
+    df_books.columns = [c.lstrip(':') for c in df_books.columns]
+    return df_books
+
+def preprocess_users_legacy(df:pd.DataFrame):
+    # row-wise phone cleanup and list aggregation used by preprocess_users_df before vectorization
+    df['phone'] = df['phone'].apply(processing.string_extract_numbers)
+    df = df.groupby('phone').agg({
+        'name':'first',
+        'address':'first',
+        'email':'first',
+        'id': lambda x: list(x)
+    })
+    return df.reset_index().rename(columns={'id': 'original_ids'})
+
+def benchmark_users_preprocessing(scale=100, repeat=3, seed=0):
+    df_users = generate_users(np.random.default_rng(seed), load_value_pools(), BASE_USERS * scale)
+    results = {
+        'legacy': time_call(lambda: preprocess_users_legacy(df_users.copy()), repeat=repeat),
+        'vectorized': time_call(lambda: processing.preprocess_users_df(df_users.copy()), repeat=repeat),
+    }
+    return pd.Series(results, name=f'seconds ({len(df_users)} users)')
+
+def write_scaled_books_yaml(yaml_file, scale, out_file):
+    with open(yaml_file, 'r', encoding='utf-8') as f:
+        records = f.read().removeprefix('---\n')
+    with open(out_file, 'w', encoding='utf-8') as f:
+        f.write('---\n')
+        for _ in range(scale):
+            f.write(records)
+
+def benchmark_books_loader(dataset_folder_number=1, scale=100, repeat=3):
+    _, _, yaml_file = get_dataset_files(dataset_folder_number)
+    with tempfile.TemporaryDirectory() as tmp:
+        scaled_file = os.path.join(tmp, 'books.yaml')
+        write_scaled_books_yaml(yaml_file, scale, scaled_file)
+        results = {
+            'yaml.safe_load': time_call(load_books_pure_yaml, scaled_file, repeat=repeat),
+            'CSafeLoader': time_call(load_books_generic, scaled_file, repeat=repeat),
+            'columnar': time_call(load_books, scaled_file, repeat=repeat),
+        }
+    return pd.Series(results, name=f'seconds (DATA{dataset_folder_number} x{scale})')
+
+# ---- Pipeline stages ----
+def read_rss_kb():
+    # current and peak resident set size, or None where /proc isn't available
+    try:
+        with open('/proc/self/status') as f:
+            status = dict(line.split(':', 1) for line in f)
+        return int(status['VmRSS'].split()[0]), int(status['VmHWM'].split()[0])
+    except (OSError, KeyError):
+        return None
+
+def reset_peak_rss():
+    # writing 5 to clear_refs resets VmHWM to the current RSS (Linux only)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def measure_stage(results:dict, trace_memory:bool, stage:str, func, *args):
+    if trace_memory:
+        rss_before = read_rss_kb() if reset_peak_rss() else None
+        tracemalloc.start()
+    start = time.perf_counter()
+    value = func(*args)
+    elapsed = time.perf_counter() - start
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # tracemalloc only sees the python allocator, so pyarrow buffers (parquet reads, arrow
+        # string and list columns) are missing from peak_mb; peak_rss_mb covers them, as growth of the
+        # RSS high-water mark over the stage (memory freed by earlier stages and reused doesn't show)
+        rss_after = read_rss_kb() if rss_before else None
+        results[stage] = {
+            'peak_mb': round(peak / 2**20, 2),
+            'peak_rss_mb': round((rss_after[1] - rss_before[0]) / 2**10, 2) if rss_after else None,
+        }
+    else:
+        results[stage] = {'seconds': round(elapsed, 4)}
+    return value
+
+def run_report_pipeline(dataset_folder_number, trace_memory:bool):
+    # mirrors get_report_data stage by stage, without the on-disk cache
+    csv_file, parquet_file, yaml_file = get_dataset_files(dataset_folder_number)
+    results = {}
+    measure = lambda stage, func, *args: measure_stage(results, trace_memory, stage, func, *args)
+    df_users = measure('import_users', pd.read_csv, csv_file)
+    df_orders = measure('import_orders', pd.read_parquet, parquet_file)
+    df_books = measure('import_books', load_books, yaml_file)
+    df_users = measure('preprocess_users', processing.preprocess_users_df, df_users)
+    df_books = measure('preprocess_books', processing.preprocess_books_df, df_books)
+    user_index = measure('build_user_id_index', processing.build_user_id_index, df_users)
+    df_orders = measure('preprocess_orders', processing.preprocess_orders_df, df_orders, user_index)
+    df_users, df_orders, df_books = measure('compact', processing.compact_frames, df_users, df_orders, df_books)
+    aggregates = measure('aggregates', processing.ReportAggregates.from_orders, df_orders)
+    measure('queries', processing.get_report_from_aggregates, aggregates, df_users, df_books)
+    sizes = {'users': len(df_users), 'orders': len(df_orders), 'books': len(df_books)}
+    return results, sizes
+
+def benchmark_report_pipeline(dataset_folder_number):
+    # tracemalloc slows down python-heavy stages, so time and memory come from separate runs
+    timings, sizes = run_report_pipeline(dataset_folder_number, trace_memory=False)
+    memory, _ = run_report_pipeline(dataset_folder_number, trace_memory=True)
+    results = [{'stage': stage, **timings[stage], **memory[stage]} for stage in timings]
+    return results, sizes
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def record_results(results:list, results_file:str, **context):
+    run = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': get_git_revision(),
+        **context,
+    }
+    with open(results_file, 'a') as f:
+        for row in results:
+            f.write(json.dumps({**run, **row}) + '\n')
+
+def benchmark_scales(scales:list, data_folder:str, results_file:str=RESULTS_FILE, seed:int=0):
+    frames = []
+    for scale in scales:
+        folder = os.path.join(data_folder, f'x{scale}')
+        if not os.path.exists(os.path.join(folder, 'orders.parquet')):
+            generate_dataset(folder, scale, seed)
+        results, sizes = benchmark_report_pipeline(folder)
+        record_results(results, results_file, scale=scale, **sizes)
+        frames.append(pd.DataFrame(results).assign(scale=scale))
+    return pd.concat(frames).pivot(index='stage', columns='scale', values=['seconds', 'peak_mb', 'peak_rss_mb'])
+
+def get_compact_memory_report(dataset_folder_number):
+    frames = processing.load_preprocessed_frames(dataset_folder_number, use_cache=False)
+    names = ['users', 'orders', 'books']
+    return processing.get_memory_report(
+        dict(zip(names, frames)),
+        dict(zip(names, processing.compact_frames(*frames)))
+    )
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark task4 processing')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+    pipeline_parser = subparsers.add_parser('pipeline', help='time and memory-profile get_report_data stages')
+    pipeline_parser.add_argument('--scale', type=int, nargs='+', default=[10, 100, 1000])
+    pipeline_parser.add_argument('--data', default='./data/synthetic')
+    pipeline_parser.add_argument('--results', default=RESULTS_FILE)
+    memory_parser = subparsers.add_parser('memory', help='report memory saved by the compact representation')
+    memory_parser.add_argument('--dataset', type=int, nargs='+', default=[1, 2, 3])
+    users_parser = subparsers.add_parser('users', help='compare phone normalization and dedup implementations')
+    users_parser.add_argument('--scale', type=int, default=100)
+    books_parser = subparsers.add_parser('books', help='compare books.yaml loaders')
+    books_parser.add_argument('--scale', type=int, default=100)
+    args = arg_parser.parse_args()
+    if args.command == 'pipeline':
+        print(benchmark_scales(args.scale, args.data, args.results).to_string())
+    elif args.command == 'memory':
+        for n in args.dataset:
+            print(f'DATA{n}')
+            print(get_compact_memory_report(n).to_string())
+    elif args.command == 'users':
+        print(benchmark_users_preprocessing(scale=args.scale))
+    else:
+        print(benchmark_books_loader(scale=args.scale))
@@ -0,0 +1,47 @@
+import hashlib
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CACHE_DIR = './cache'
+
+
+def get_cache_key(paths:list, version):
+    h = hashlib.sha1(str(version).encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f'{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}'.encode())
+    return h.hexdigest()[:16]
+
+def get_cache_path(cache_dir:str, name:str, key:str, frame_name:str):
+    return os.path.join(cache_dir, f'{name}-{key}-{frame_name}.parquet')
+
+def read_cached_frames(cache_dir:str, name:str, key:str, frame_names:list):
+    paths = [get_cache_path(cache_dir, name, key, f) for f in frame_names]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    return [read_parquet_frame(p) for p in paths]
+
+def read_parquet_frame(path:str):
+    # pandas metadata can't describe arrow list columns, so list columns are mapped explicitly
+    return pq.read_table(path).to_pandas(
+        types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_list(t) else None,
+        ignore_metadata=True
+    )
+
+def write_cached_frames(cache_dir:str, name:str, key:str, frames:dict):
+    os.makedirs(cache_dir, exist_ok=True)
+    for frame_name, df in frames.items():
+        path = get_cache_path(cache_dir, name, key, frame_name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    evict_stale_entries(cache_dir, name, key)
+
+def evict_stale_entries(cache_dir:str, name:str, key:str):
+    for file_name in os.listdir(cache_dir):
+        if not file_name.startswith(f'{name}-') or not file_name.endswith('.parquet'):
+            continue
+        if not file_name.startswith(f'{name}-{key}-'):
+            os.remove(os.path.join(cache_dir, file_name))
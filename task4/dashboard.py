@@ -1,8 +1,42 @@
 import streamlit as st
 import matplotlib.pyplot as plt
-from processing import get_report_data
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import cache
+from processing import get_report_data, get_dataset_files, PIPELINE_VERSION
 
-st.title('Task 4 BI dashboard')
+DATASET_FOLDER_NUMBERS = [1, 2, 3]
+COMPUTE_REPORTS_IN_PARALLEL = True
+
+
+@st.cache_resource
+def get_report_pool():
+    # workers are spawned, since forking the multi-threaded streamlit server is unsafe
+    return ProcessPoolExecutor(
+        max_workers=len(DATASET_FOLDER_NUMBERS),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+def get_source_key(dataset_folder_number):
+    # same size/mtime key as the parquet cache, so changed dataset files give a fresh report
+    return cache.get_cache_key(get_dataset_files(dataset_folder_number), PIPELINE_VERSION)
+
+@st.cache_resource(max_entries=2 * len(DATASET_FOLDER_NUMBERS))
+def submit_report(dataset_folder_number, source_key):
+    return get_report_pool().submit(get_report_data, dataset_folder_number)
+
+@st.cache_data(max_entries=2 * len(DATASET_FOLDER_NUMBERS))
+def load_report(dataset_folder_number, source_key):
+    return get_report_data(dataset_folder_number)
+
+def get_report_result(future, dataset_folder_number, source_key):
+    if future.exception() is not None:
+        # don't keep a failed computation cached, retry on next rerun
+        submit_report.clear(dataset_folder_number, source_key)
+        if isinstance(future.exception(), BrokenProcessPool):
+            get_report_pool.clear()
+    return future.result()
 
 def get_daily_revenue_chart(daily_revenue):
     ticks = daily_revenue.index[::50]
@@ -43,7 +77,7 @@ def render_tab(
     
     st.markdown('---')
     st.subheader('Top 5 Days by revenue (YYYY-MM-DD)')
-    st.table(top_5_days_by_revenue)
+    st.table(top_5_days_by_revenue.rename(index=lambda d: d.strftime('%Y-%m-%d')))
     
     
 
@@ -51,13 +85,28 @@ def render_tab(
     st.subheader('Daily revenue chart')
     st.pyplot(get_daily_revenue_chart(daily_revenue))
 
-tab1, tab2, tab3 = st.tabs(['DATA1', 'DATA2', 'DATA3'])
-
+def main():
+    st.title('Task 4 BI dashboard')
+    tabs = st.tabs([f'DATA{n}' for n in DATASET_FOLDER_NUMBERS])
+    placeholders = {}
+    for tab, n in zip(tabs, DATASET_FOLDER_NUMBERS):
+        with tab:
+            placeholders[n] = st.empty()
+            placeholders[n].info('Computing report...')
+    source_keys = {n: get_source_key(n) for n in DATASET_FOLDER_NUMBERS}
 
-with tab1:
-    render_tab(*get_report_data(dataset_folder_number=1))
-with tab2:
-    render_tab(*get_report_data(dataset_folder_number=2))
-with tab3:
-    render_tab(*get_report_data(dataset_folder_number=3))
+    if COMPUTE_REPORTS_IN_PARALLEL:
+        # start every report, then fill each tab as soon as its own report is done
+        futures = {submit_report(n, source_keys[n]): n for n in DATASET_FOLDER_NUMBERS}
+        for future in as_completed(futures):
+            n = futures[future]
+            with placeholders[n].container():
+                render_tab(*get_report_result(future, n, source_keys[n]))
+    else:
+        for n in DATASET_FOLDER_NUMBERS:
+            with placeholders[n].container():
+                render_tab(*load_report(n, source_keys[n]))
 
+# spawned report workers import this script as __mp_main__ and must not render it
+if __name__ == '__main__':
+    main()
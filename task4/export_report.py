@@ -0,0 +1,92 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from processing import get_dataset_name, get_report_data
+
+# headless entry point: only the processing stack is imported, never streamlit or matplotlib
+
+
+def report_to_dict(report):
+    top_days, unique_users, unique_author_sets, most_popular_author, top_customer, daily_revenue = report
+    return {
+        'unique_users': int(unique_users),
+        'unique_author_sets': int(unique_author_sets),
+        'most_popular_author': list(most_popular_author),
+        'top_customer': {
+            'name': top_customer['name'],
+            'ids': [int(i) for i in top_customer['ids']],
+        },
+        'top_5_days_by_revenue': [
+            {'date': d.strftime('%Y-%m-%d'), 'revenue': float(r)} for d, r in top_days.items()
+        ],
+        'daily_revenue': [
+            {'date': d.strftime('%Y-%m-%d'), 'revenue': float(r)} for d, r in daily_revenue.items()
+        ],
+    }
+
+def write_json(report, out_folder:str, name:str):
+    path = os.path.join(out_folder, f'{name}.json')
+    with open(path, 'w') as f:
+        json.dump(report_to_dict(report), f, indent=2)
+    return [path]
+
+def write_parquet(report, out_folder:str, name:str):
+    data = report_to_dict(report)
+    metrics = pd.DataFrame([{
+        'unique_users': data['unique_users'],
+        'unique_author_sets': data['unique_author_sets'],
+        'most_popular_author': data['most_popular_author'],
+        'top_customer_name': data['top_customer']['name'],
+        'top_customer_ids': data['top_customer']['ids'],
+        'top_days': [d['date'] for d in data['top_5_days_by_revenue']],
+        'top_days_revenue': [d['revenue'] for d in data['top_5_days_by_revenue']],
+    }])
+    daily_revenue = report[5].rename('revenue').rename_axis('date').reset_index()
+    paths = [
+        os.path.join(out_folder, f'{name}-metrics.parquet'),
+        os.path.join(out_folder, f'{name}-daily_revenue.parquet'),
+    ]
+    metrics.to_parquet(paths[0], index=False)
+    daily_revenue.to_parquet(paths[1], index=False)
+    return paths
+
+WRITERS = {
+    'json': write_json,
+    'parquet': write_parquet,
+}
+
+def export_dataset(folder:str, out_folder:str, output_format:str, backend:str='pandas'):
+    report = get_report_data(folder, backend=backend)
+    name = get_dataset_name(folder)
+    return WRITERS[output_format](report, out_folder, name)
+
+def export_datasets(folders:list, out_folder:str, output_format:str='json', backend:str='pandas', workers:int=None):
+    if output_format not in WRITERS:
+        raise ValueError(f'format must be one of: {", ".join(WRITERS)}')
+    os.makedirs(out_folder, exist_ok=True)
+    # folders naming the same dataset would write the same files, so each is exported once
+    folders = list({get_dataset_name(folder): folder for folder in folders}.values())
+    with ProcessPoolExecutor(max_workers=workers or min(len(folders), os.cpu_count() or 1)) as pool:
+        futures = {
+            folder: pool.submit(export_dataset, folder, out_folder, output_format, backend)
+            for folder in folders
+        }
+        return {folder: future.result() for folder, future in futures.items()}
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Export task4 report metrics without the dashboard')
+    arg_parser.add_argument('folders', nargs='*', help='dataset folders or numbers, defaults to ./data/DATA*')
+    arg_parser.add_argument('--out', default='./reports')
+    arg_parser.add_argument('--format', choices=list(WRITERS), default='json')
+    arg_parser.add_argument('--backend', choices=['pandas', 'sql'], default='pandas')
+    arg_parser.add_argument('--workers', type=int, default=None)
+    args = arg_parser.parse_args()
+    folders = [int(f) if f.isdigit() else f for f in args.folders] or sorted(glob.glob('./data/DATA*'))
+    if not folders:
+        arg_parser.error('no dataset folders found')
+    for folder, paths in export_datasets(folders, args.out, args.format, args.backend, args.workers).items():
+        print(folder, '->', ', '.join(paths))
@@ -0,0 +1,229 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import yaml
+from processing import get_dataset_files, load_books
+
+# row counts of DATA1, scale factors multiply these
+BASE_USERS = 3300
+BASE_BOOKS = 750
+BASE_ORDERS = 11000
+
+DUPLICATE_USER_RATIO = 0.15
+DUPLICATE_BOOK_RATIO = 0.03
+DUPLICATE_ORDER_RATIO = 0.05
+
+PHONE_FORMATS = [
+    '({0}) {1}-{2}',
+    '{0}-{1}-{2}',
+    '{0}.{1}.{2}',
+    '{0} {1} {2}',
+]
+PRICE_FORMATS = [
+    '${0}', '$ {0}', '{0}$', '{0} $',
+    'USD{0}', 'USD {0}', '{0}USD', '{0} USD',
+    '€{0}', '{0}€', '{0} €',
+    'EUR{0}', 'EUR {0}', '{0}EUR', '{0} EUR',
+]
+# (date format, time format, separator, date first); %p markers are rewritten by PM_MARKERS
+TIMESTAMP_FORMATS = [
+    ('%Y-%m-%d', '%H:%M:%S', ',', True),
+    ('%Y-%m-%d', '%H:%M:%S', ', ', True),
+    ('%Y-%m-%d', '%H:%M:%S', 'T', True),
+    ('%Y-%m-%d', '%H:%M', ';', False),
+    ('%Y-%m-%d', '%I:%M:%S %p', ',', False),
+    ('%Y-%m-%d', '%I:%M:%S %p', ', ', True),
+    ('%m/%d/%y', '%H:%M:%S', ', ', True),
+    ('%m/%d/%y', '%H:%M:%S', ';', True),
+    ('%m/%d/%y', '%H:%M:%S', ';', False),
+    ('%m/%d/%y', '%I:%M:%S %p', ' ', False),
+    ('%d-%b-%Y', '%H:%M:%S', ' ', True),
+    ('%d-%b-%Y', '%H:%M:%S', ',', True),
+    ('%d-%b-%Y', '%I:%M:%S %p', ', ', False),
+    ('%d-%B-%Y', '%H:%M', ';', False),
+    ('%d.%m.%Y', '%H:%M:%S', ' ', True),
+    ('%a %b %d', '%H:%M:%S %Y', ' ', True),
+]
+PM_MARKERS = [('AM', 'PM'), ('am', 'pm'), ('A.M.', 'P.M.'), ('a.m.', 'p.m.')]
+JUNK_YEARS = [0, '0', '-', '\t', 'NULL', ' ', '', None, -1]
+JUNK_YEAR_RATIO = 0.015
+
+
+def load_value_pools(seed_folder_number=1):
+    csv_file, _, yaml_file = get_dataset_files(seed_folder_number)
+    df_users = pd.read_csv(csv_file)
+    df_books = load_books(yaml_file)
+    authors = df_books['author'].str.split(',').explode().str.strip()
+    return {
+        'names': df_users['name'].dropna().unique(),
+        'addresses': df_users['address'].dropna().unique(),
+        'email_domains': df_users['email'].dropna().str.split('@').str[1].unique(),
+        'titles': df_books['title'].dropna().unique(),
+        'authors': authors[authors != ''].unique(),
+        'genres': df_books['genre'].dropna().unique(),
+        'publishers': df_books['publisher'].dropna().unique(),
+    }
+
+def format_by_group(values:pd.DataFrame, group_codes:np.ndarray, formats:list, format_group):
+    result = pd.Series('', index=values.index, dtype=object)
+    for code, fmt in enumerate(formats):
+        mask = group_codes == code
+        if mask.any():
+            result[mask] = format_group(values[mask], fmt)
+    return result
+
+def generate_phones(rng:np.random.Generator, n:int):
+    digits = pd.DataFrame({
+        'area': pd.Series(rng.integers(100, 1000, n)).astype(str),
+        'prefix': pd.Series(rng.integers(0, 1000, n)).astype(str).str.zfill(3),
+        'line': pd.Series(rng.integers(0, 10000, n)).astype(str).str.zfill(4),
+    })
+    return digits, rng.integers(0, len(PHONE_FORMATS), n)
+
+def format_phones(digits:pd.DataFrame, format_codes:np.ndarray):
+    def format_group(group, fmt):
+        return [fmt.format(a, p, l) for a, p, l in zip(group['area'], group['prefix'], group['line'])]
+    return format_by_group(digits, format_codes, PHONE_FORMATS, format_group)
+
+def generate_users(rng:np.random.Generator, pools:dict, n:int, first_id:int=40000):
+    n_unique = n - int(n * DUPLICATE_USER_RATIO)
+    digits, format_codes = generate_phones(rng, n_unique)
+    # duplicates reuse another person's phone, usually written differently
+    person = np.concatenate([np.arange(n_unique), rng.integers(0, n_unique, n - n_unique)])
+    rng.shuffle(person)
+    format_codes = np.where(
+        np.arange(n) < n_unique,
+        format_codes[person],
+        rng.integers(0, len(PHONE_FORMATS), n)
+    )
+    digits = digits.iloc[person].reset_index(drop=True)
+    names = pools['names'][rng.integers(0, len(pools['names']), n_unique)][person]
+    logins = pd.Series(names).str.lower().str.replace(r'[^a-z]+', '.', regex=True).str.strip('.')
+    domains = pools['email_domains'][rng.integers(0, len(pools['email_domains']), n)]
+    return pd.DataFrame({
+        'id': first_id + rng.permutation(n),
+        'name': names,
+        'address': pools['addresses'][rng.integers(0, len(pools['addresses']), n)],
+        'phone': format_phones(digits, format_codes).to_numpy(),
+        'email': (logins + '@' + domains).to_numpy(),
+    })
+
+def generate_books(rng:np.random.Generator, pools:dict, n:int, first_id:int=19000):
+    n_unique = n - int(n * DUPLICATE_BOOK_RATIO)
+    n_authors = rng.choice([1, 1, 1, 2, 2, 3, 4, 5], n_unique)
+    author_codes = rng.integers(0, len(pools['authors']), n_authors.sum())
+    authors = pd.Series(pools['authors'][author_codes])
+    authors = authors.groupby(np.repeat(np.arange(n_unique), n_authors)).agg(', '.join)
+    years = rng.integers(1850, 2025, n_unique).astype(object)
+    junk = rng.random(n_unique) < JUNK_YEAR_RATIO
+    years[junk] = np.array(JUNK_YEARS, dtype=object)[rng.integers(0, len(JUNK_YEARS), junk.sum())]
+    df = pd.DataFrame({
+        'title': pools['titles'][rng.integers(0, len(pools['titles']), n_unique)],
+        'author': authors.to_numpy(),
+        'genre': pools['genres'][rng.integers(0, len(pools['genres']), n_unique)],
+        'publisher': pools['publishers'][rng.integers(0, len(pools['publishers']), n_unique)],
+        'year': years,
+    })
+    # duplicated catalog entries differ only by id
+    df = pd.concat([df, df.iloc[rng.integers(0, n_unique, n - n_unique)]], ignore_index=True)
+    df.insert(0, 'id', first_id + rng.permutation(n))
+    return df.iloc[rng.permutation(n)].reset_index(drop=True)
+
+def generate_unit_prices(rng:np.random.Generator, n:int):
+    cents = rng.choice([0, 25, 50, 75, 99], n)
+    amounts = pd.DataFrame({
+        'units': rng.integers(5, 80, n),
+        'cents': cents,
+        'style': rng.integers(0, 4, n),
+    })
+    def format_amount(units, cents, style):
+        if style == 0:
+            return f'{units}.{cents:02d}'
+        if style == 1:
+            return f'{units}.{cents}' if cents % 10 else f'{units}.{cents // 10}'
+        if style == 2 and cents == 0:
+            return f'{units}.'
+        return f'{units}.{cents:02d}' if cents else str(units)
+    def format_group(group, fmt):
+        return [
+            fmt.format(format_amount(u, c, s))
+            for u, c, s in zip(group['units'], group['cents'], group['style'])
+        ]
+    return format_by_group(amounts, rng.integers(0, len(PRICE_FORMATS), n), PRICE_FORMATS, format_group)
+
+def generate_timestamps(rng:np.random.Generator, n:int, start='2024-01-01', days:int=550):
+    seconds = rng.integers(0, days * 24 * 3600, n)
+    moments = pd.DataFrame({'moment': pd.Timestamp(start) + pd.to_timedelta(seconds, unit='s')})
+    upper = rng.random(n) < 0.3
+    markers = rng.integers(0, len(PM_MARKERS), n)
+    def format_group(group, fmt):
+        date_fmt, time_fmt, separator, date_first = fmt
+        dates = group['moment'].dt.strftime(date_fmt)
+        times = group['moment'].dt.strftime(time_fmt)
+        if '%p' in time_fmt:
+            group_markers = markers[group.index]
+            for code, (am, pm) in enumerate(PM_MARKERS):
+                mask = group_markers == code
+                times[mask] = times[mask].str.replace('AM', am).str.replace('PM', pm)
+        if '%b' in date_fmt or '%B' in date_fmt:
+            dates = dates.where(~upper[group.index], dates.str.upper())
+        if date_first:
+            return (dates + separator + times).to_numpy()
+        return (times + separator + dates).to_numpy()
+    return format_by_group(moments, rng.integers(0, len(TIMESTAMP_FORMATS), n), TIMESTAMP_FORMATS, format_group)
+
+def generate_orders(rng:np.random.Generator, df_users:pd.DataFrame, df_books:pd.DataFrame, n:int, first_id:int=60000):
+    n_unique = n - int(n * DUPLICATE_ORDER_RATIO)
+    df = pd.DataFrame({
+        'user_id': df_users['id'].to_numpy()[rng.integers(0, len(df_users), n_unique)],
+        'book_id': df_books['id'].to_numpy()[rng.integers(0, len(df_books), n_unique)],
+        'quantity': rng.choice([1, 1, 1, 1, 2, 2, 3, 4, 5], n_unique).astype('int32'),
+        'unit_price': generate_unit_prices(rng, n_unique).to_numpy(),
+        'timestamp': generate_timestamps(rng, n_unique).to_numpy(),
+    })
+    # re-sent orders: same user, book and timestamp, dropped by the dedup rule
+    df = pd.concat([df, df.iloc[rng.integers(0, n_unique, n - n_unique)]], ignore_index=True)
+    df.insert(0, 'id', first_id + np.arange(n))
+    df['shipping'] = np.where(
+        rng.random(n) < 0.5,
+        df_users['address'].to_numpy()[rng.integers(0, len(df_users), n)],
+        rng.choice(['', None], n)
+    )
+    return df.iloc[rng.permutation(n)].reset_index(drop=True)
+
+def write_books_yaml(df_books:pd.DataFrame, yaml_file):
+    records = [
+        {f':{k}': v for k, v in record.items()}
+        for record in df_books.astype(object).where(df_books.notna(), None).to_dict('records')
+    ]
+    with open(yaml_file, 'w', encoding='utf-8') as f:
+        yaml.dump(
+            records, f,
+            Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+            sort_keys=False,
+            allow_unicode=True,
+            explicit_start=True
+        )
+
+def generate_dataset(out_folder, scale:int, seed:int=0, seed_folder_number=1):
+    rng = np.random.default_rng(seed)
+    pools = load_value_pools(seed_folder_number)
+    df_users = generate_users(rng, pools, BASE_USERS * scale)
+    df_books = generate_books(rng, pools, BASE_BOOKS * scale)
+    df_orders = generate_orders(rng, df_users, df_books, BASE_ORDERS * scale)
+    os.makedirs(out_folder, exist_ok=True)
+    df_users.to_csv(os.path.join(out_folder, 'users.csv'), index=False)
+    df_orders.to_parquet(os.path.join(out_folder, 'orders.parquet'), index=False)
+    write_books_yaml(df_books, os.path.join(out_folder, 'books.yaml'))
+    return out_folder
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Generate synthetic task4 datasets')
+    arg_parser.add_argument('--scale', type=int, nargs='+', default=[10, 100, 1000])
+    arg_parser.add_argument('--out', default='./data/synthetic')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    for scale in args.scale:
+        print(generate_dataset(os.path.join(args.out, f'x{scale}'), scale, args.seed))
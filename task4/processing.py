@@ -1,18 +1,148 @@
 import pandas as pd
+import numpy as np
 import yaml
 import re
+import glob
+import os
+import pickle
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from dateutil import parser
+import cache
+
+# bump whenever preprocessing output changes, so cached datasets get rebuilt
+PIPELINE_VERSION = 6
+
+TIMESTAMP_DATE_REGEX = r'(\d{1,4}[-/][a-zA-Z0-9]{1,9}[-/]\d{1,4})'
+# (pattern, format) pairs tried in order on the date part of a timestamp,
+# capture groups are joined with a space before parsing
+TIMESTAMP_DATE_FORMATS = [
+    (r'^(\d{4}-\d{1,2}-\d{1,2})$', '%Y-%m-%d'),
+    (r'^(\d{1,2}/\d{1,2}/\d{2})$', '%m/%d/%y'),
+    (r'^(\d{1,2}/\d{1,2}/\d{4})$', '%m/%d/%Y'),
+    (r'^(\d{1,2}-[a-zA-Z]{3}-\d{4})$', '%d-%b-%Y'),
+    (r'^(\d{1,2}-[a-zA-Z]{4,9}-\d{4})$', '%d-%B-%Y'),
+    (r'^\s*(\d{1,2}\.\d{1,2}\.\d{4})\s', '%m.%d.%Y'),
+    (r'^\s*(\d{1,2}\.\d{1,2}\.\d{4})\s', '%d.%m.%Y'),
+    (r'^[a-zA-Z]{3}\s+([a-zA-Z]{3})\s+(\d{1,2})\s.*\s(\d{4})\s*$', '%b %d %Y'),
+]
+
+
+# columns the order preprocessing and report aggregates actually read
+ORDER_COLUMNS = ['user_id', 'book_id', 'quantity', 'unit_price', 'timestamp']
+ORDER_BATCH_SIZE = 65536
+# bump when the pickled IncrementalReport layout changes, so saved states get rebuilt
+INCREMENTAL_STATE_VERSION = 3
+
+# trailing extension such as 'x123', 'ext. 123' or '#123'
+PHONE_EXTENSION_REGEX = r'(?i)\s*(?:x|ext\.?|extension|#)\s*\d+\s*$'
+ORIGINAL_IDS_DTYPE = pd.ArrowDtype(pa.list_(pa.int64()))
+AUTHORS_DTYPE = pd.ArrowDtype(pa.list_(pa.string()))
+# joins sorted author names into one comparable key per book
+AUTHORS_KEY_SEPARATOR = '\x1f'
+
+BOOKS_YAML_LINE = re.compile(r'^(- |  ):([A-Za-z_]\w*):(?: (.*))?$')
+BOOKS_YAML_INT = re.compile(r'^[-+]?(0|[1-9][0-9]*)$')
+BOOKS_YAML_INDICATORS = set('-?:,[]{}#&*!|>%@`')
+BOOKS_YAML_RESOLVER = yaml.resolver.Resolver()
 
 
 # ---- Helper functions ----
 def import_data(csv_file, parquet_file, yaml_file):
     df_users = pd.read_csv(csv_file)
     df_orders = pd.read_parquet(parquet_file)
+    df_books = load_books(yaml_file)
+    return df_users, df_orders, df_books
+
+def iter_order_chunks(parquet_file, columns:list=ORDER_COLUMNS, batch_size:int=ORDER_BATCH_SIZE):
+    parquet = pq.ParquetFile(parquet_file)
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+def load_books_generic(yaml_file):
     with open(yaml_file, 'r') as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
     df_books = pd.DataFrame(data)
     df_books.columns = [c.lstrip(':') for c in df_books.columns]
-    return df_users, df_orders, df_books
+    return df_books
+
+def resolve_books_yaml_scalar(raw:str):
+    if raw == '':
+        return None
+    if raw[0] == "'":
+        if len(raw) < 2 or raw[-1] != "'":
+            raise ValueError(f'unsupported quoted scalar: {raw}')
+        return raw[1:-1].replace("''", "'")
+    if raw[0] == '"':
+        value = yaml.safe_load(raw)
+        if not isinstance(value, str):
+            raise ValueError(f'unsupported quoted scalar: {raw}')
+        return value
+    if BOOKS_YAML_INT.match(raw):
+        return int(raw)
+    if raw[0] in BOOKS_YAML_INDICATORS or ' #' in raw or ': ' in raw:
+        raise ValueError(f'unsupported plain scalar: {raw}')
+    tag = BOOKS_YAML_RESOLVER.resolve(yaml.ScalarNode, raw, (True, False))
+    if tag == 'tag:yaml.org,2002:str':
+        return raw
+    if tag == 'tag:yaml.org,2002:null':
+        return None
+    raise ValueError(f'unsupported plain scalar: {raw} ({tag})')
+
+def load_books_columns(yaml_file):
+    # streams the fixed `- :key: value` layout into raw column arrays
+    columns = {}
+    record_keys = []
+    n_records = 0
+    last_key = None
+    with open(yaml_file, 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            line = line.rstrip('\r\n')
+            if i == 0 and line == '---':
+                continue
+            matched = BOOKS_YAML_LINE.match(line)
+            if matched:
+                new_record, key, raw = matched.groups()
+                if new_record == '- ':
+                    if n_records and len(record_keys) != len(columns):
+                        raise ValueError(f'record {n_records} is missing keys')
+                    n_records += 1
+                    record_keys = []
+                if key in record_keys or (n_records > 1 and key not in columns):
+                    raise ValueError(f'unexpected key {key} in record {n_records}')
+                if n_records == 0:
+                    raise ValueError('field outside of a record')
+                columns.setdefault(key, []).append((raw or '').strip())
+                record_keys.append(key)
+                last_key = key
+            elif line.startswith('    ') and last_key is not None and line.strip():
+                # folded continuation of a plain multi-line scalar
+                prev = columns[last_key][-1]
+                if not prev or prev[0] in '\'"':
+                    raise ValueError(f'unsupported multi-line scalar in record {n_records}')
+                columns[last_key][-1] = f'{prev} {line.strip()}'
+            else:
+                raise ValueError(f'unexpected line {i + 1}: {line}')
+    if n_records and len(record_keys) != len(columns):
+        raise ValueError(f'record {n_records} is missing keys')
+    resolved = {}
+    for key, raws in columns.items():
+        memo = {}
+        values = []
+        for raw in raws:
+            if raw not in memo:
+                memo[raw] = resolve_books_yaml_scalar(raw)
+            values.append(memo[raw])
+        resolved[key] = values
+    return resolved
+
+def load_books(yaml_file):
+    try:
+        columns = load_books_columns(yaml_file)
+    except (ValueError, UnicodeDecodeError, yaml.YAMLError):
+        return load_books_generic(yaml_file)
+    return pd.DataFrame(columns)
 
 def string_extract_numbers(s:str):
     return re.sub(r'[^0-9]','',s)
@@ -38,49 +168,186 @@ def get_paid_price(unit_price:str, quantity):
     converted = num if curr == 'usd' else convert_EUR_USD(num)
     return quantity * converted
 
-def extract_date_from_timestamp(t:str):
-    matched = re.search(r'(\d{1,4}[-/][a-zA-Z0-9]{1,9}[-/]\d{1,4})', t)
+def series_extract_numbers_decimals(s:pd.Series):
+    parts = s.str.extract(r'([0-9]+)\D+([0-9]+)')
+    decimals = parts[0] + '.' + parts[1]
+    numbers = s.str.replace(r'[^0-9]', '', regex=True)
+    return decimals.fillna(numbers).astype(float)
+
+def series_extract_currency(s:pd.Series):
+    return s.str.lower().str.contains(r'usd|\$', regex=True).map({True:'usd', False:'eur'})
+
+def get_paid_prices(unit_prices:pd.Series, quantities:pd.Series):
+    nums = series_extract_numbers_decimals(unit_prices)
+    is_usd = series_extract_currency(unit_prices) == 'usd'
+    converted = nums.where(is_usd, convert_EUR_USD(nums))
+    return quantities * converted
+
+def parse_date_from_timestamp(t:str):
+    matched = re.search(TIMESTAMP_DATE_REGEX, t)
     if not matched:
-        dt = parser.parse(t)
-    else:
-        dt = pd.to_datetime(matched.group(1), errors='raise')
-    return dt.strftime('%Y-%m-%d')
+        return parser.parse(t)
+    return pd.to_datetime(matched.group(1), errors='raise')
+
+def extract_date_from_timestamp(t:str):
+    return parse_date_from_timestamp(t).strftime('%Y-%m-%d')
+
+def normalize_timestamps_to_dates(s:pd.Series):
+    codes, uniques = pd.factorize(s)
+    uniques = pd.Series(uniques, dtype=object)
+    sources = uniques.str.extract(TIMESTAMP_DATE_REGEX)[0].fillna(uniques)
+    dates = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[s]')
+    pending = pd.Series(True, index=uniques.index)
+    for pattern, fmt in TIMESTAMP_DATE_FORMATS:
+        parts = sources[pending].str.extract(pattern).dropna()
+        if parts.empty:
+            continue
+        text = parts[0].str.cat([parts[c] for c in parts.columns[1:]], sep=' ')
+        parsed = pd.to_datetime(text, format=fmt, errors='coerce').dropna()
+        dates[parsed.index] = parsed
+        pending[parsed.index] = False
+    leftovers = uniques[pending]
+    if not leftovers.empty:
+        dates[leftovers.index] = pd.to_datetime(leftovers.map(parse_date_from_timestamp))
+    dates = dates.dt.normalize().to_numpy()
+    return pd.Series(
+        pd.api.extensions.take(dates, codes, allow_fill=True),
+        index=s.index,
+        name=s.name
+    )
+
+def canonicalize_phones(s:pd.Series):
+    digits = s.str.replace(PHONE_EXTENSION_REGEX, '', regex=True).str.replace(r'[^0-9]', '', regex=True)
+    # drop the +1 / 001 country code of otherwise complete numbers
+    has_one = (digits.str.len() == 11) & digits.str.startswith('1')
+    has_double_zero_one = (digits.str.len() == 13) & digits.str.startswith('001')
+    digits = digits.mask(has_one, digits.str.slice(1))
+    return digits.mask(has_double_zero_one, digits.str.slice(3))
+
+def group_by_codes(values:pd.Series, sort:bool=True):
+    codes, uniques = pd.factorize(values, sort=sort)
+    order = np.argsort(codes, kind='stable')
+    offsets = np.zeros(len(uniques) + 1, dtype='int64')
+    np.cumsum(np.bincount(codes, minlength=len(uniques)), out=offsets[1:])
+    return codes, uniques, order, offsets
+
+def build_list_column(values:np.ndarray, offsets:np.ndarray, name:str=None):
+    lists = pa.ListArray.from_arrays(pa.array(offsets, pa.int64()), pa.array(values))
+    return pd.Series(pd.arrays.ArrowExtensionArray(lists), name=name)
 
 def deduplicate_users_by_phone(df:pd.DataFrame):
-    df = df.groupby('phone')
-    df = df.agg({
-        'name':'first',
-        'address':'first',
-        'email':'first',
-        'id': lambda x: list(x)
-    })
-    df = df.reset_index()
-    df = df.rename(columns={'id': 'original_ids'})
-    return df
+    df = df[df['phone'].notna()]
+    codes, phones, order, offsets = group_by_codes(df['phone'])
+    result = df[['name', 'address', 'email']].groupby(codes).first().reset_index(drop=True)
+    result.insert(0, 'phone', np.asarray(phones))
+    result['original_ids'] = build_list_column(
+        df['id'].to_numpy(dtype='int64')[order], offsets
+    ).astype(ORIGINAL_IDS_DTYPE)
+    return result
 
+def build_user_id_index(df_users:pd.DataFrame):
+    original_ids = df_users['original_ids']
+    user_index = pd.Series(
+        np.repeat(df_users['user_key'].to_numpy(), original_ids.list.len().to_numpy()),
+        index=pd.Index(original_ids.list.flatten().to_numpy(dtype='int64'), name='user_id'),
+        name='user_key'
+    )
+    # each raw user id must belong to exactly one phone group, or orders can't be mapped to a customer
+    if not user_index.index.is_unique:
+        duplicated = user_index.index[user_index.index.duplicated()].unique()
+        raise ValueError(f'user ids in more than one phone group: {list(duplicated[:10])}')
+    return user_index
 
 # ---- Preprocessing ----
 def preprocess_users_df(df:pd.DataFrame):
-    df['phone'] = df['phone'].apply(string_extract_numbers)
+    df['phone'] = canonicalize_phones(df['phone'])
     df = deduplicate_users_by_phone(df)
+    df['user_key'] = np.arange(len(df))
     return df
 
-def preprocess_orders_df(df:pd.DataFrame):
-    df['paid_price'] = df.apply(
-        lambda row: get_paid_price(row['unit_price'], row['quantity']),
-        axis=1
-    )
-    df['date'] = df['timestamp'].apply(extract_date_from_timestamp)
-    df = df.drop_duplicates(subset=['user_id','book_id','date'])
+def preprocess_orders_df(df:pd.DataFrame, user_index:pd.Series):
+    df['paid_price'] = get_paid_prices(df['unit_price'], df['quantity'])
+    df['date'] = normalize_timestamps_to_dates(df['timestamp'])
+    df = df.drop_duplicates(subset=['user_id','book_id','date']).reset_index(drop=True)
+    df['user_key'] = df['user_id'].map(user_index).astype('Int64')
     return df    
 
+def split_sorted_authors(authors:pd.Series):
+    exploded = authors.reset_index(drop=True).str.split(',').explode()
+    exploded = pd.DataFrame({'row': exploded.index.to_numpy(), 'author': exploded.str.strip().to_numpy()})
+    exploded = exploded.sort_values(['row', 'author'], kind='stable')
+    offsets = np.zeros(len(authors) + 1, dtype='int64')
+    np.cumsum(np.bincount(exploded['row'], minlength=len(authors)), out=offsets[1:])
+    result = build_list_column(exploded['author'].to_numpy(dtype=object), offsets, name=authors.name)
+    result.index = authors.index
+    return result
+
+def join_authors_keys(authors:pd.Series):
+    keys = pc.binary_join(pa.array(authors), AUTHORS_KEY_SEPARATOR).to_pandas()
+    keys.index = authors.index
+    return keys
+
 def preprocess_books_df(df:pd.DataFrame):
-    df['authors_set_sorted'] = df['author'].str.split(',').apply(
-        lambda list: tuple(sorted(a.strip() for a in list))
-    )
-    df = df.drop_duplicates(subset=['title','author','year','publisher'])
+    df['authors'] = split_sorted_authors(df['author'])
+    df['authors_key'] = join_authors_keys(df['authors'])
+    df = df.drop_duplicates(subset=['title','author','year','publisher']).reset_index(drop=True)
+    # raw 'year' mixes ints with junk strings; one string column keeps it the same in memory and in parquet
+    df['year'] = df['year'].astype('str')
     return df
 
+def get_book_authors(df_books:pd.DataFrame, book_id):
+    return tuple(df_books.loc[df_books['id'] == book_id, 'authors'].iloc[0])
+
+def build_author_index(df_books:pd.DataFrame):
+    authors = df_books['authors']
+    return pd.DataFrame({
+        'author': authors.list.flatten().to_numpy(),
+        'book_id': np.repeat(df_books['id'].to_numpy(), authors.list.len().to_numpy())
+    })
+
+# ---- Compact representation ----
+# object columns with fewer distinct values than this share of rows become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+def compact_integers(s:pd.Series):
+    if s.empty:
+        return s
+    if isinstance(s.dtype, pd.Int64Dtype):
+        for dtype, info in (('Int8', np.iinfo(np.int8)), ('Int16', np.iinfo(np.int16)), ('Int32', np.iinfo(np.int32))):
+            if s.min() >= info.min and s.max() <= info.max:
+                return s.astype(dtype)
+        return s
+    return pd.to_numeric(s, downcast='integer')
+
+def compact_column(s:pd.Series):
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return compact_integers(s)
+    if not (pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype)):
+        return s
+    first = s.dropna().head(1)
+    if not first.empty and isinstance(first.iloc[0], (list, np.ndarray)):
+        return s
+    if s.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(s):
+        return s.astype('category')
+    return s
+
+def compact_df(df:pd.DataFrame):
+    return pd.DataFrame({c: compact_column(df[c]) for c in df.columns}, index=df.index)
+
+def compact_frames(df_users:pd.DataFrame, df_orders:pd.DataFrame, df_books:pd.DataFrame):
+    return compact_df(df_users), compact_df(df_orders), compact_df(df_books)
+
+def get_memory_usage(df:pd.DataFrame):
+    return df.memory_usage(deep=True).sum()
+
+def get_memory_report(frames_before:dict, frames_after:dict):
+    report = pd.DataFrame({
+        'before_mb': {name: get_memory_usage(df) / 2**20 for name, df in frames_before.items()},
+        'after_mb': {name: get_memory_usage(df) / 2**20 for name, df in frames_after.items()},
+    })
+    report['saved_pct'] = 100 * (1 - report['after_mb'] / report['before_mb'])
+    return report.round(2)
+
 # ---- Queries ----
 def get_unique_users(df:pd.DataFrame):
     return len(df)
@@ -97,7 +364,7 @@ def get_top_5_days_by_revenue(df:pd.DataFrame):
     return result
 
 def get_unique_sets_of_authors(df:pd.DataFrame):
-    result = df['authors_set_sorted'].nunique()
+    result = df['authors_key'].nunique()
     return result
 
 def get_most_popular_author(df_books:pd.DataFrame, df_orders:pd.DataFrame):
@@ -106,23 +373,35 @@ def get_most_popular_author(df_books:pd.DataFrame, df_orders:pd.DataFrame):
         .sum()
         .idxmax()
     )
-    author = df_books.loc[df_books['id'] == bestseller_book_id, 'authors_set_sorted'].iloc[0]
-    return author
+    return get_book_authors(df_books, bestseller_book_id)
 
-def get_top_customer_by_spending(df_orders:pd.DataFrame, df_users:pd.DataFrame):
-    top_spender_id = (
-        df_orders.groupby('user_id')['paid_price']
-        .sum()
-        .idxmax()
-    )
-    top_spender_row = (
-        df_users[df_users['original_ids'].apply(lambda ids: top_spender_id in ids)].iloc[0]
-    )
+def get_customer_spending(df_orders:pd.DataFrame):
+    if 'user_key' not in df_orders.columns:
+        raise ValueError('orders have no user_key column; preprocess them with preprocess_orders_df(df, build_user_id_index(df_users))')
+    return df_orders.groupby('user_key')['paid_price'].sum()
+
+def get_top_customers_from_spending(spending:pd.Series, df_users:pd.DataFrame, n:int=10):
+    spending = spending.nlargest(n)
+    result = df_users.iloc[spending.index.to_numpy(dtype='int64')][['name', 'original_ids']]
+    result = result.assign(spending=spending.to_numpy())
+    return result.reset_index(drop=True)
+
+def get_top_customer_from_spending(spending:pd.Series, df_users:pd.DataFrame):
+    top_spender_row = get_top_customers_from_spending(spending, df_users, n=1).iloc[0]
     return {
         'name': top_spender_row['name'],
         'ids': top_spender_row['original_ids']
     }
 
+def get_top_customers_by_spending(df_orders:pd.DataFrame, df_users:pd.DataFrame, n:int=10):
+    return get_top_customers_from_spending(get_customer_spending(df_orders), df_users, n)
+
+def get_top_customer_by_spending(df_orders:pd.DataFrame, df_users:pd.DataFrame):
+    return get_top_customer_from_spending(get_customer_spending(df_orders), df_users)
+
+def get_user_by_id(df_users:pd.DataFrame, user_index:pd.Series, user_id):
+    return df_users.iloc[user_index[user_id]]
+
 def get_daily_revenue_series(df:pd.DataFrame):
     daily_revenue = (
         df.groupby('date')['paid_price']
@@ -131,23 +410,312 @@ def get_daily_revenue_series(df:pd.DataFrame):
     )
     return daily_revenue 
 
+# ---- Aggregates ----
+class ReportAggregates:
+    def __init__(self):
+        self.daily_revenue = pd.Series(dtype='float64', index=pd.DatetimeIndex([], name='date'), name='paid_price')
+        self.book_quantity = pd.Series(dtype='int64', index=pd.Index([], dtype='int64', name='book_id'), name='quantity')
+        self.book_revenue = pd.Series(dtype='float64', index=pd.Index([], dtype='int64', name='book_id'), name='paid_price')
+        self.user_spending = pd.Series(dtype='float64', index=pd.Index([], dtype='int64', name='user_key'), name='paid_price')
+        # author -> book_id index of the last books frame queried, so author queries don't rescan df_books
+        self.author_index = None
+        self.author_index_books = None
+
+    @classmethod
+    def from_orders(cls, df_orders:pd.DataFrame):
+        aggregates = cls()
+        aggregates.add_orders(df_orders)
+        return aggregates
+
+    @staticmethod
+    def _merge(current:pd.Series, new:pd.Series):
+        if current.empty:
+            return new
+        return current.add(new, fill_value=0).astype(current.dtype)
+
+    def add_orders(self, df_orders:pd.DataFrame):
+        # one groupby per key: date, book_id (quantity and revenue together) and user_key. Grouping once by
+        # (date, book_id, user_key) barely shrinks the data, since orders are deduplicated on nearly that key,
+        # and measured about 4x slower than these three hash groupbys
+        book_sales = df_orders.groupby('book_id')[['quantity', 'paid_price']].sum()
+        self.daily_revenue = self._merge(self.daily_revenue, df_orders.groupby('date')['paid_price'].sum())
+        self.book_quantity = self._merge(self.book_quantity, book_sales['quantity'].astype('int64'))
+        self.book_revenue = self._merge(self.book_revenue, book_sales['paid_price'])
+        self.user_spending = self._merge(self.user_spending, get_customer_spending(df_orders))
+        return self
+
+    # ---- revenue ----
+    def get_top_days_by_revenue(self, n:int=5):
+        result = self.daily_revenue.sort_values(ascending=False).head(n)
+        result = result.rename('Revenue')
+        result.index.name = 'Date'
+        return result
+
+    def get_daily_revenue_series(self):
+        return self.daily_revenue.sort_index()
+
+    def get_revenue_series(self, freq:str):
+        return self.get_daily_revenue_series().resample(freq).sum()
+
+    def get_weekly_revenue_series(self):
+        return self.get_revenue_series('W')
+
+    def get_monthly_revenue_series(self):
+        return self.get_revenue_series('MS')
+
+    # ---- books ----
+    def get_bestseller_book_id(self):
+        return self.book_quantity.idxmax()
+
+    def get_most_popular_author(self, df_books:pd.DataFrame):
+        bestseller_book_id = self.get_bestseller_book_id()
+        return get_book_authors(df_books, bestseller_book_id)
+
+    # ---- authors ----
+    def get_author_index(self, df_books:pd.DataFrame):
+        if self.author_index_books is not df_books:
+            self.author_index = build_author_index(df_books)
+            self.author_index_books = df_books
+        return self.author_index
+
+    def get_author_ranking(self, df_books:pd.DataFrame):
+        # co-authors are each credited with the full quantity and revenue of a book
+        sales = pd.DataFrame({'quantity': self.book_quantity, 'revenue': self.book_revenue})
+        joined = self.get_author_index(df_books).join(sales, on='book_id', how='inner')
+        ranking = joined.groupby('author', sort=False)[['quantity', 'revenue']].sum()
+        return ranking.sort_values(['quantity', 'revenue'], ascending=False)
+
+    def get_top_authors(self, df_books:pd.DataFrame, n:int=10):
+        return self.get_author_ranking(df_books).head(n)
+
+    def get_author_revenue(self, df_books:pd.DataFrame):
+        return self.get_author_ranking(df_books)['revenue'].sort_values(ascending=False)
+
+    # ---- customers ----
+    def get_top_customers(self, df_users:pd.DataFrame, n:int=10):
+        return get_top_customers_from_spending(self.user_spending, df_users, n)
+
+    def get_top_customer(self, df_users:pd.DataFrame):
+        return get_top_customer_from_spending(self.user_spending, df_users)
+
 # ---- Data report -------
-def get_report_data(dataset_folder_number):
-    df_users, df_orders, df_books = import_data(
-        f'./data/DATA{dataset_folder_number}/users.csv',
-        f'./data/DATA{dataset_folder_number}/orders.parquet',
-        f'./data/DATA{dataset_folder_number}/books.yaml'
+# datasets are given by DATA folder number or, e.g. for generated data, by folder path
+def get_dataset_folder(dataset_folder_number):
+    if isinstance(dataset_folder_number, int):
+        return f'./data/DATA{dataset_folder_number}'
+    return dataset_folder_number
+
+def get_dataset_name(dataset_folder_number):
+    # a folder number and any path to the same folder share one name, e.g. 1, './data/DATA1' -> 'DATA1'
+    folder = os.path.abspath(get_dataset_folder(dataset_folder_number))
+    if os.path.dirname(folder) == os.path.abspath('./data'):
+        return os.path.basename(folder)
+    path = os.path.relpath(folder)
+    if path.startswith(os.pardir):
+        path = folder
+    return re.sub(r'\W+', '_', path).strip('_')
+
+def get_dataset_files(dataset_folder_number):
+    folder = get_dataset_folder(dataset_folder_number)
+    return (
+        os.path.join(folder, 'users.csv'),
+        os.path.join(folder, 'orders.parquet'),
+        os.path.join(folder, 'books.yaml')
     )
+
+def get_order_batch_files(dataset_folder_number):
+    folder = get_dataset_folder(dataset_folder_number)
+    return sorted(
+        glob.glob(os.path.join(folder, 'orders*.parquet')) +
+        glob.glob(os.path.join(folder, 'orders', '*.parquet'))
+    )
+
+def load_preprocessed_users_and_books(dataset_folder_number):
+    csv_file, _, yaml_file = get_dataset_files(dataset_folder_number)
+    df_users = preprocess_users_df(pd.read_csv(csv_file))
+    df_books = preprocess_books_df(load_books(yaml_file))
+    return df_users, df_books
+
+def prepare_frames_for_cache(df_users:pd.DataFrame, df_orders:pd.DataFrame, df_books:pd.DataFrame):
+    return {'users': df_users, 'orders': df_orders, 'books': df_books}
+
+def restore_cached_frames(df_users:pd.DataFrame, df_orders:pd.DataFrame, df_books:pd.DataFrame):
+    # parquet drops the nullable integer dtype, stores dates in ms and renames list fields,
+    # so every column is cast back to what a cold load produces
+    df_users['original_ids'] = df_users['original_ids'].astype(ORIGINAL_IDS_DTYPE)
+    df_orders['user_key'] = df_orders['user_key'].astype('Int64')
+    df_orders['date'] = df_orders['date'].astype('datetime64[s]')
+    df_books['authors'] = df_books['authors'].astype(AUTHORS_DTYPE)
+    return df_users, df_orders, df_books
+
+def load_preprocessed_data(dataset_folder_number, use_cache=True, cache_dir=cache.CACHE_DIR, compact=True):
+    frames = load_preprocessed_frames(dataset_folder_number, use_cache, cache_dir)
+    return compact_frames(*frames) if compact else frames
+
+def load_preprocessed_frames(dataset_folder_number, use_cache=True, cache_dir=cache.CACHE_DIR):
+    files = get_dataset_files(dataset_folder_number)
+    if use_cache:
+        name = get_dataset_name(dataset_folder_number)
+        key = cache.get_cache_key(files, PIPELINE_VERSION)
+        cached = cache.read_cached_frames(cache_dir, name, key, ['users', 'orders', 'books'])
+        if cached is not None:
+            return restore_cached_frames(*cached)
+    df_users, df_orders, df_books = import_data(*files)
     df_users = preprocess_users_df(df_users)
     df_books = preprocess_books_df(df_books)
-    df_orders = preprocess_orders_df(df_orders)
+    df_orders = preprocess_orders_df(df_orders, build_user_id_index(df_users))
+    if use_cache:
+        cache.write_cached_frames(
+            cache_dir, name, key,
+            prepare_frames_for_cache(df_users, df_orders, df_books)
+        )
+    return df_users, df_orders, df_books
+
+def get_report_data(dataset_folder_number, use_cache=True, backend='pandas'):
+    if backend == 'sql':
+        import sql_backend
+        return sql_backend.get_report_data(dataset_folder_number)
+    if backend != 'pandas':
+        raise ValueError('backend must be: pandas or sql')
+    df_users, df_orders, df_books = load_preprocessed_data(dataset_folder_number, use_cache)
+    aggregates = ReportAggregates.from_orders(df_orders)
+    return get_report_from_aggregates(aggregates, df_users, df_books)
+
+def get_report_from_aggregates(aggregates:ReportAggregates, df_users:pd.DataFrame, df_books:pd.DataFrame):
     return (
-        get_top_5_days_by_revenue(df_orders), 
+        aggregates.get_top_days_by_revenue(5), 
         get_unique_users(df_users), 
         get_unique_sets_of_authors(df_books), 
-        get_most_popular_author(df_books, df_orders), 
-        get_top_customer_by_spending(df_orders, df_users),
-        get_daily_revenue_series(df_orders)
+        aggregates.get_most_popular_author(df_books), 
+        aggregates.get_top_customer(df_users),
+        aggregates.get_daily_revenue_series()
     )
-    
 
+# ---- Incremental report ----
+def get_order_keys(df_orders:pd.DataFrame):
+    # 64-bit hash of the dedup key; date unit is fixed so hashes survive a parquet round trip
+    keys = df_orders[['user_id', 'book_id']].assign(date=df_orders['date'].astype('datetime64[s]'))
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+class OrderKeySet:
+    # sorted uint64 runs of dedup hashes. Memory is 8 bytes per unique order, so it still grows with
+    # the order history (about 800 MB per 100M orders), but not with the width or size of the rows.
+    # A new run is merged into the last one while that is at most twice as long, which keeps
+    # O(log n) runs and amortized O(log n) merge work per key.
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, keys:np.ndarray):
+        # searchsorted walks the run far faster with sorted needles
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, sorted_keys), len(run) - 1)
+            found |= run[positions] == sorted_keys
+        result = np.empty(len(keys), dtype=bool)
+        result[order] = found
+        return result
+
+    def add(self, keys:np.ndarray):
+        run = np.unique(keys)
+        if len(run) == 0:
+            return
+        while self.runs and len(self.runs[-1]) <= 2 * len(run):
+            # both runs are sorted, so the stable sort only merges them
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind='stable')
+        self.runs.append(run)
+
+def get_users_and_books_key(dataset_folder_number):
+    csv_file, _, yaml_file = get_dataset_files(dataset_folder_number)
+    return cache.get_cache_key([csv_file, yaml_file], f'{PIPELINE_VERSION}.{INCREMENTAL_STATE_VERSION}')
+
+class IncrementalReport:
+    def __init__(self, df_users:pd.DataFrame, df_books:pd.DataFrame, source_key:str=None):
+        # source_key identifies the users/books files and pipeline version the state was built from
+        self.source_key = source_key
+        self.df_users = df_users
+        self.df_books = df_books
+        self.user_index = build_user_id_index(df_users)
+        self.reset_orders()
+
+    def reset_orders(self):
+        self.aggregates = ReportAggregates()
+        self.order_keys = OrderKeySet()
+        # absolute path -> (size, mtime_ns) of every ingested order file
+        self.ingested_files = {}
+
+    @classmethod
+    def for_dataset(cls, dataset_folder_number):
+        source_key = get_users_and_books_key(dataset_folder_number)
+        return cls(*load_preprocessed_users_and_books(dataset_folder_number), source_key=source_key)
+
+    @classmethod
+    def load(cls, state_file:str):
+        with open(state_file, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, state_file:str):
+        os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+        tmp_file = f'{state_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_file, state_file)
+
+    def ingest_orders(self, df_orders:pd.DataFrame):
+        df_orders = preprocess_orders_df(df_orders, self.user_index)
+        keys = get_order_keys(df_orders)
+        is_new = ~self.order_keys.contains(keys)
+        df_orders = df_orders[is_new]
+        self.order_keys.add(keys[is_new])
+        self.aggregates.add_orders(df_orders)
+        return len(df_orders)
+
+    def ingest_order_files(self, order_files:list, batch_size:int=ORDER_BATCH_SIZE):
+        signatures = {}
+        for path in order_files:
+            st = os.stat(path)
+            signatures[os.path.abspath(path)] = (st.st_size, st.st_mtime_ns)
+        # an ingested file that was rewritten, appended to or removed can't be subtracted from the
+        # aggregates, so every file is ingested again from scratch
+        if any(signatures.get(path) != signature for path, signature in self.ingested_files.items()):
+            self.reset_orders()
+        ingested = 0
+        for path, signature in signatures.items():
+            if path in self.ingested_files:
+                continue
+            for chunk in iter_order_chunks(path, batch_size=batch_size):
+                ingested += self.ingest_orders(chunk)
+            self.ingested_files[path] = signature
+        return ingested
+
+    def get_report(self):
+        return get_report_from_aggregates(self.aggregates, self.df_users, self.df_books)
+
+def get_streaming_report_data(dataset_folder_number, batch_size:int=ORDER_BATCH_SIZE):
+    _, parquet_file, _ = get_dataset_files(dataset_folder_number)
+    report = IncrementalReport.for_dataset(dataset_folder_number)
+    report.ingest_order_files([parquet_file], batch_size)
+    return report.get_report()
+
+def get_incremental_report_data(dataset_folder_number, state_file:str=None):
+    if state_file is None:
+        state_file = os.path.join(cache.CACHE_DIR, f'{get_dataset_name(dataset_folder_number)}-incremental.pkl')
+    report = None
+    if os.path.exists(state_file):
+        report = IncrementalReport.load(state_file)
+        # users.csv, books.yaml or the pipeline changed: replay all order files against fresh users and books
+        if getattr(report, 'source_key', None) != get_users_and_books_key(dataset_folder_number):
+            report = None
+    rebuilt = report is None
+    if rebuilt:
+        report = IncrementalReport.for_dataset(dataset_folder_number)
+    ingested_files = dict(report.ingested_files)
+    report.ingest_order_files(get_order_batch_files(dataset_folder_number))
+    # files whose rows were all duplicates still count as ingested, so they are not re-read next time
+    if rebuilt or report.ingested_files != ingested_files:
+        report.save(state_file)
+    return report.get_report()
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import pandas as pd
+import cache
+import processing
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE users (user_key INTEGER PRIMARY KEY, phone TEXT, name TEXT, address TEXT, email TEXT);
+CREATE TABLE user_ids (user_id INTEGER NOT NULL, user_key INTEGER NOT NULL);
+CREATE TABLE books (id INTEGER, title TEXT, author TEXT, genre TEXT, publisher TEXT, year TEXT, authors_key TEXT);
+CREATE TABLE book_authors (book_id INTEGER, author TEXT);
+CREATE TABLE orders (user_id INTEGER, user_key INTEGER, book_id INTEGER, quantity INTEGER, paid_price REAL, date TEXT);
+'''
+INDEXES = '''
+CREATE INDEX idx_orders_date ON orders (date, paid_price);
+CREATE INDEX idx_orders_book_id ON orders (book_id, quantity, paid_price);
+CREATE INDEX idx_orders_user_id ON orders (user_id);
+CREATE INDEX idx_orders_user_key ON orders (user_key, paid_price);
+CREATE UNIQUE INDEX idx_user_ids_user_id ON user_ids (user_id);
+CREATE INDEX idx_user_ids_user_key ON user_ids (user_key);
+CREATE INDEX idx_books_id ON books (id);
+CREATE INDEX idx_book_authors_book_id ON book_authors (book_id, author);
+'''
+
+
+# ---- Loading ----
+def get_sql_frames(df_users:pd.DataFrame, df_orders:pd.DataFrame, df_books:pd.DataFrame):
+    user_index = processing.build_user_id_index(df_users)
+    return {
+        'users': df_users[['user_key', 'phone', 'name', 'address', 'email']],
+        'user_ids': user_index.reset_index(),
+        'books': df_books[['id', 'title', 'author', 'genre', 'publisher']].assign(
+            year=df_books['year'].astype('string'),
+            authors_key=df_books['authors_key']
+        ),
+        'book_authors': processing.build_author_index(df_books)[['book_id', 'author']],
+        'orders': df_orders[['user_id', 'user_key', 'book_id', 'quantity', 'paid_price']].assign(
+            user_key=df_orders['user_key'].astype('Int64'),
+            date=df_orders['date'].dt.strftime('%Y-%m-%d')
+        ),
+    }
+
+def build_database(db_path:str, df_users:pd.DataFrame, df_orders:pd.DataFrame, df_books:pd.DataFrame, key:str=''):
+    tmp_path = db_path if db_path == ':memory:' else f'{db_path}.{os.getpid()}.tmp'
+    if tmp_path != ':memory:' and os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(SCHEMA)
+    for table, df in get_sql_frames(df_users, df_orders, df_books).items():
+        df.astype(object).where(df.notna(), None).to_sql(table, conn, if_exists='append', index=False)
+    conn.executescript(INDEXES)
+    conn.execute('INSERT INTO meta VALUES (?, ?)', ('cache_key', key))
+    conn.commit()
+    if tmp_path == ':memory:':
+        return conn
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return sqlite3.connect(db_path)
+
+def get_database_key(conn:sqlite3.Connection):
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'cache_key'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    return row[0] if row else None
+
+def get_database_path(dataset_folder_number, cache_dir:str=cache.CACHE_DIR):
+    return os.path.join(cache_dir, f'{processing.get_dataset_name(dataset_folder_number)}.sqlite')
+
+def open_database(dataset_folder_number, db_path:str=None, cache_dir:str=cache.CACHE_DIR):
+    files = processing.get_dataset_files(dataset_folder_number)
+    key = cache.get_cache_key(files, processing.PIPELINE_VERSION)
+    if db_path is None:
+        db_path = get_database_path(dataset_folder_number, cache_dir)
+    if db_path != ':memory:' and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        if get_database_key(conn) == key:
+            return conn
+        conn.close()
+    if db_path != ':memory:':
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    frames = processing.load_preprocessed_data(dataset_folder_number, cache_dir=cache_dir, compact=False)
+    return build_database(db_path, *frames, key=key)
+
+
+# ---- Queries ----
+def to_date_index(dates:pd.Series, name:str):
+    return pd.DatetimeIndex(pd.to_datetime(dates).astype('datetime64[s]'), name=name)
+
+def get_top_days_by_revenue(conn:sqlite3.Connection, n:int=5):
+    df = pd.read_sql_query(
+        'SELECT date, SUM(paid_price) AS revenue FROM orders GROUP BY date ORDER BY revenue DESC LIMIT ?',
+        conn, params=(n,)
+    )
+    return pd.Series(df['revenue'].to_numpy(), index=to_date_index(df['date'], 'Date'), name='Revenue')
+
+def get_daily_revenue_series(conn:sqlite3.Connection):
+    df = pd.read_sql_query('SELECT date, SUM(paid_price) AS revenue FROM orders GROUP BY date ORDER BY date', conn)
+    return pd.Series(df['revenue'].to_numpy(), index=to_date_index(df['date'], 'date'), name='paid_price')
+
+def get_unique_users(conn:sqlite3.Connection):
+    return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+def get_unique_sets_of_authors(conn:sqlite3.Connection):
+    return conn.execute('SELECT COUNT(DISTINCT authors_key) FROM books').fetchone()[0]
+
+def get_most_popular_author(conn:sqlite3.Connection):
+    rows = conn.execute('''
+        SELECT author FROM book_authors WHERE book_id = (
+            SELECT book_id FROM orders GROUP BY book_id ORDER BY SUM(quantity) DESC, book_id LIMIT 1
+        )
+        ORDER BY author
+    ''').fetchall()
+    return tuple(r[0] for r in rows)
+
+def get_top_customers_by_spending(conn:sqlite3.Connection, n:int=10):
+    top = conn.execute('''
+        SELECT user_key, SUM(paid_price) AS spending FROM orders
+        WHERE user_key IS NOT NULL
+        GROUP BY user_key ORDER BY spending DESC, user_key LIMIT ?
+    ''', (n,)).fetchall()
+    customers = []
+    for user_key, spending in top:
+        name = conn.execute('SELECT name FROM users WHERE user_key = ?', (user_key,)).fetchone()[0]
+        ids = conn.execute('SELECT user_id FROM user_ids WHERE user_key = ? ORDER BY rowid', (user_key,)).fetchall()
+        customers.append({'name': name, 'original_ids': [r[0] for r in ids], 'spending': spending})
+    return pd.DataFrame(customers, columns=['name', 'original_ids', 'spending'])
+
+def get_top_customer_by_spending(conn:sqlite3.Connection):
+    top = get_top_customers_by_spending(conn, n=1).iloc[0]
+    return {
+        'name': top['name'],
+        'ids': top['original_ids']
+    }
+
+def get_author_ranking(conn:sqlite3.Connection):
+    # co-authors are each credited with the full quantity and revenue of a book
+    return pd.read_sql_query('''
+        SELECT a.author, SUM(s.quantity) AS quantity, SUM(s.revenue) AS revenue
+        FROM book_authors a
+        JOIN (
+            SELECT book_id, SUM(quantity) AS quantity, SUM(paid_price) AS revenue
+            FROM orders GROUP BY book_id
+        ) s ON s.book_id = a.book_id
+        GROUP BY a.author
+        ORDER BY quantity DESC, revenue DESC
+    ''', conn, index_col='author')
+
+
+# ---- Data report -------
+def get_report_data(dataset_folder_number, db_path:str=None):
+    conn = open_database(dataset_folder_number, db_path)
+    try:
+        return (
+            get_top_days_by_revenue(conn, 5),
+            get_unique_users(conn),
+            get_unique_sets_of_authors(conn),
+            get_most_popular_author(conn),
+            get_top_customer_by_spending(conn),
+            get_daily_revenue_series(conn)
+        )
+    finally:
+        conn.close()
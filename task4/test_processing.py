@@ -0,0 +1,47 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+import processing
+
+DATASETS = [1, 2, 3]
+
+
+@pytest.fixture(autouse=True)
+def in_task_dir(monkeypatch):
+    # dataset folders are resolved relative to task4
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('dataset', DATASETS)
+def test_paid_prices_match_row_wise_parser(dataset):
+    _, parquet_file, _ = processing.get_dataset_files(dataset)
+    o = pd.read_parquet(parquet_file, columns=['unit_price', 'quantity'])
+    expected = [processing.get_paid_price(u, q) for u, q in zip(o['unit_price'], o['quantity'])]
+    result = processing.get_paid_prices(o['unit_price'], o['quantity'])
+    np.testing.assert_array_equal(result.to_numpy(dtype=float), np.asarray(expected, dtype=float))
+
+
+@pytest.mark.parametrize('dataset', DATASETS)
+def test_cached_load_matches_cold_load(dataset, tmp_path):
+    cold = processing.load_preprocessed_frames(dataset, use_cache=False)
+    processing.load_preprocessed_frames(dataset, cache_dir=str(tmp_path))
+    cached = processing.load_preprocessed_frames(dataset, cache_dir=str(tmp_path))
+    for expected, result in zip(cold, cached):
+        pd.testing.assert_frame_equal(result, expected)
+
+
+def test_incremental_report_rereads_rewritten_order_file(tmp_path):
+    dataset = str(tmp_path / 'dataset')
+    shutil.copytree(processing.get_dataset_folder(1), dataset)
+    state_file = str(tmp_path / 'state.pkl')
+    report = processing.get_incremental_report_data(dataset, state_file)
+    pd.testing.assert_series_equal(report[5], processing.get_report_data(dataset, use_cache=False)[5])
+
+    _, parquet_file, _ = processing.get_dataset_files(dataset)
+    df_orders = pd.read_parquet(parquet_file)
+    df_orders.iloc[:len(df_orders) // 2].to_parquet(parquet_file)
+    rewritten = processing.get_incremental_report_data(dataset, state_file)
+    assert not rewritten[5].equals(report[5])
+    pd.testing.assert_series_equal(rewritten[5], processing.get_report_data(dataset, use_cache=False)[5])
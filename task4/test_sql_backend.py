@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import processing
+import sql_backend
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DATASETS = [os.path.join(DATA_DIR, f'DATA{n}') for n in [1, 2, 3]]
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(monkeypatch, tmp_path):
+    # the parquet cache and the sqlite file are written under ./cache
+    monkeypatch.chdir(tmp_path)
+
+
+def assert_revenue_series_close(result:pd.Series, expected:pd.Series):
+    assert result.index.equals(expected.index)
+    assert result.name == expected.name
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+
+
+@pytest.mark.parametrize('dataset', DATASETS)
+def test_sql_report_matches_pandas(dataset):
+    expected = processing.get_report_data(dataset)
+    result = processing.get_report_data(dataset, backend='sql')
+    top_days, unique_users, unique_sets_of_authors, most_popular_author, top_customer, daily_revenue = result
+    assert_revenue_series_close(top_days, expected[0])
+    assert unique_users == expected[1]
+    assert unique_sets_of_authors == expected[2]
+    assert most_popular_author == expected[3]
+    assert top_customer['name'] == expected[4]['name']
+    assert list(top_customer['ids']) == list(expected[4]['ids'])
+    assert_revenue_series_close(daily_revenue, expected[5])
+
+
+@pytest.mark.parametrize('dataset', DATASETS)
+def test_sql_author_ranking_matches_pandas(dataset):
+    df_users, df_orders, df_books = processing.load_preprocessed_data(dataset)
+    expected = processing.ReportAggregates.from_orders(df_orders).get_author_ranking(df_books)
+    conn = sql_backend.open_database(dataset)
+    try:
+        result = sql_backend.get_author_ranking(conn)
+    finally:
+        conn.close()
+    # revenue sums can differ in the last bits, which may reorder authors tied on quantity
+    assert result.index.sort_values().equals(expected.index.sort_values())
+    result = result.loc[expected.index]
+    np.testing.assert_array_equal(result['quantity'].to_numpy(), expected['quantity'].to_numpy())
+    np.testing.assert_allclose(result['revenue'].to_numpy(), expected['revenue'].to_numpy())
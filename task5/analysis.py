@@ -1,5 +1,98 @@
 import pandas as pd
-from outliers import smirnov_grubbs
+import numpy as np
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from scipy import stats
+
+# outlier masks kept per analyzer, keyed by (method, mine, params)
+RESULT_CACHE_SIZE = 128
+
+
+@lru_cache(maxsize=None)
+def grubbs_critical_values(n:int, alpha:float):
+    # one-sided G critical value for every sample size 0..n, as outlier-utils computes it per iteration
+    sizes = np.arange(n + 1, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = stats.t.isf(alpha / sizes, sizes - 2)
+        g = ((sizes - 1) / np.sqrt(sizes)) * np.sqrt(t**2 / (sizes - 2 + t**2))
+    g[:3] = np.nan
+    g.flags.writeable = False
+    return g
+
+def grubbs_statistics(sorted_values:np.ndarray):
+    # sorted_values is days x mines with the most extreme value first; row k holds the G statistic
+    # after removing the first k values. What remains is always a suffix, so mean and variance are
+    # accumulated with Welford's update from the last row up: subtracting removed values from running
+    # sums cancels catastrophically once a large spike is gone, adding values does not
+    n = len(sorted_values)
+    mean = np.empty(sorted_values.shape)
+    m2 = np.empty(sorted_values.shape)
+    running_mean = np.zeros(sorted_values.shape[1])
+    running_m2 = np.zeros(sorted_values.shape[1])
+    for k in range(n - 1, -1, -1):
+        delta = sorted_values[k] - running_mean
+        running_mean = running_mean + delta / (n - k)
+        running_m2 = running_m2 + delta * (sorted_values[k] - running_mean)
+        mean[k] = running_mean
+        m2[k] = running_m2
+    remaining = (n - np.arange(n))[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.abs(sorted_values - mean) / np.sqrt(m2 / remaining)
+
+def grubbs_outlier_counts(g:np.ndarray, alpha:float):
+    # number of leading values the iterative test removes: the first step that is not significant
+    n = len(g)
+    if n == 0:
+        return np.zeros(g.shape[1], dtype=int)
+    remaining = n - np.arange(n)
+    significant = g > grubbs_critical_values(n, alpha)[remaining][:, None]
+    return np.argmin(significant, axis=0)
+
+
+class OutlierResult:
+    # days x mines boolean mask over the analyzer frame; rows are only copied by to_frame
+    def __init__(self, df:pd.DataFrame, mines:list, mask:np.ndarray):
+        self.df = df
+        self.mines = mines
+        self.mask = mask
+
+    def __len__(self):
+        return int(self.mask.sum())
+
+    @property
+    def empty(self):
+        return not self.mask.any()
+
+    def _column(self, mine:str):
+        return self.mines.index(mine)
+
+    def count(self, mine:str=None):
+        if mine is None:
+            return len(self)
+        return int(self.mask[:, self._column(mine)].sum())
+
+    def get_mask(self, mine:str):
+        return self.mask[:, self._column(mine)]
+
+    def get_positions(self, mine:str):
+        return np.flatnonzero(self.get_mask(mine))
+
+    def for_mine(self, mine:str):
+        column = self._column(mine)
+        return OutlierResult(self.df, [mine], self.mask[:, column:column + 1])
+
+    def to_frame(self):
+        # long format: matching rows of the frame plus a Mine column, grouped by mine then date
+        mine_idx, row_idx = np.nonzero(self.mask.T)
+        outliers = self.df.iloc[row_idx]
+        if len(self.mines) > 1:
+            outliers = outliers.reset_index(drop=True)
+        else:
+            outliers = outliers.copy()
+        outliers['Mine'] = np.asarray(self.mines, dtype=object)[mine_idx]
+        return outliers
+
 
 class MineStatsAnalyzer:
     def __init__(self, df:pd.DataFrame):
@@ -8,91 +101,141 @@ class MineStatsAnalyzer:
         for col in df.columns:
             if col != 'Date':
                 self.mines.append(col)
+        self._mine_positions = {m: i for i, m in enumerate(self.mines)}
+        self._values = None
+        self._stats = {}
+        self._results = OrderedDict()
+        # the dashboard shares one analyzer between sessions, so the caches are filled under a lock;
+        # reentrant because computing a mask reads cached statistics
+        self._lock = threading.RLock()
 
     def get_all_mines(self):
         return self.mines
 
-    def _aggregate_outliers(self, function_per_mine, mine:str, *args, **kwargs):
-        if mine is not None:
-            return function_per_mine(mine, *args, **kwargs)
-        else:
-            outliers = []
-            for m in self.mines:
-                outliers.append(function_per_mine(m, *args, **kwargs))
-            return pd.concat(outliers).reset_index(drop=True)
+    # ---- cached statistics ----
+    def _values_matrix(self):
+        with self._lock:
+            if self._values is None:
+                self._values = self.df[self.mines].to_numpy(dtype=float)
+            return self._values
+
+    def _columns(self, mine:str):
+        return slice(None) if mine is None else [self._mine_positions[mine]]
+
+    def _statistic(self, key, compute):
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = compute()
+            return self._stats[key]
+
+    def _describe(self):
+        def compute():
+            stats = self.df[self.mines].describe().transpose()
+            stats['iqr'] = stats['75%'] - stats['25%']
+            stats['median'] = stats['50%']
+            return stats[['mean','std','median','iqr']]
+        return self._statistic('describe', compute)
+
+    def _quartiles(self):
+        return self._statistic('quartiles', lambda: np.nanquantile(self._values_matrix(), [0.25, 0.75], axis=0))
+
+    def _abs_zscores(self):
+        def compute():
+            values = self._values_matrix()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.abs((values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0, ddof=1))
+        return self._statistic('abs_zscores', compute)
+
+    def _ma_distances(self, window:int):
+        def compute():
+            moving_avarage = self.df[self.mines].rolling(window).mean().to_numpy(dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.abs(self._values_matrix() - moving_avarage) / moving_avarage
+        return self._statistic(('ma_distances', window), compute)
+
+    def _grubbs_side(self, side:str):
+        def compute():
+            values = self._values_matrix()
+            # stable sort so tied values are removed in original order, like repeated argmax/argmin
+            order = np.argsort(-values if side == 'max' else values, axis=0, kind='stable')
+            g = grubbs_statistics(np.take_along_axis(values, order, axis=0))
+            # outlier-utils never flags anything in a series containing NaN
+            g[:, np.isnan(values).any(axis=0)] = np.nan
+            return order, g
+        return self._statistic(('grubbs', side), compute)
+
+    def _cached_mask(self, method:str, mine:str, params:tuple, compute_mask):
+        key = (method, mine, params)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            mask = compute_mask(self._columns(mine), *params)
+            mask.flags.writeable = False
+            self._results[key] = mask
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return mask
+
+    def _get_outliers(self, method:str, mine:str, params:tuple, compute_mask):
+        mask = self._cached_mask(method, mine, params, compute_mask)
+        return OutlierResult(self.df, self.mines if mine is None else [mine], mask)
+
+    def get_empty_outliers(self, mine:str=None):
+        mines = self.mines if mine is None else [mine]
+        return OutlierResult(self.df, mines, np.zeros((len(self.df), len(mines)), dtype=bool))
 
     def get_descriptive_statistics(self, mine:str=None):
         if mine is not None:
-            data = self.df[mine]
-        else:
-            data = self.df[self.mines]
-        stats = data.describe().transpose()
-        stats['iqr'] = stats['75%'] - stats['25%']
-        stats['median'] = stats['50%']
-        return stats[['mean','std','median','iqr']]
-    
+            return self._describe().loc[mine].copy()
+        return self._describe().copy()
+
     # ---- IQR ----
-    def _iqr_outliers_for_mine(self, mine:str, bound_modifier:float):
-        q1 = self.df[mine].quantile(0.25)
-        q3 = self.df[mine].quantile(0.75)
+    def _iqr_mask(self, columns, bound_modifier:float):
+        values = self._values_matrix()[:, columns]
+        q1, q3 = self._quartiles()[:, columns]
         iqr = q3 - q1
-        lower_bound = q1 - bound_modifier * iqr
-        upper_bound = q3 + bound_modifier * iqr
-        outliers = self.df[(self.df[mine] < lower_bound) | (self.df[mine] > upper_bound)].copy()
-        outliers['Mine'] = mine
-        return outliers
+        return (values < q1 - bound_modifier * iqr) | (values > q3 + bound_modifier * iqr)
 
     def get_outliers_IQR(self, mine=None, bound_modifier=1.5):
-        return self._aggregate_outliers(self._iqr_outliers_for_mine, mine, bound_modifier)
-    
+        return self._get_outliers('IQR', mine, (bound_modifier,), self._iqr_mask)
+
     # ---- z-score ----
-    def _zscore_outliers_for_mine(self, mine:str, treshold:float):
-        mean = self.df[mine].mean()
-        std = self.df[mine].std()
-        z = abs((self.df[mine] - mean) / std)
-        outliers = self.df[z > treshold].copy()
-        outliers['Mine'] = mine
-        return outliers
-    
+    def _zscore_mask(self, columns, treshold:float):
+        return self._abs_zscores()[:, columns] > treshold
+
     def get_outliers_zscore(self, mine=None, treshold=2):
-        return self._aggregate_outliers(self._zscore_outliers_for_mine, mine, treshold)
+        return self._get_outliers('Z-score', mine, (treshold,), self._zscore_mask)
 
     # ---- distance from MA ----
-    def _ma_outliers_for_mine(self, mine:str, window:int, distance_percent_treshold:float):
-        mine_data = self.df[mine]
-        moving_avarage = mine_data.rolling(window).mean()
-        distance_percent = (abs(mine_data - moving_avarage)) / moving_avarage
-        outliers = self.df[distance_percent > distance_percent_treshold].copy()
-        outliers['Mine'] = mine
-        return outliers
-    
+    def _ma_mask(self, columns, window:int, distance_percent_treshold:float):
+        return self._ma_distances(window)[:, columns] > distance_percent_treshold
+
     def get_outliers_moving_avarage(self, mine=None, window:int=7, distance_percent_treshold:float=0.15):
-        return self._aggregate_outliers(self._ma_outliers_for_mine, mine, window, distance_percent_treshold)
-    
-    # ---- grubbs test ----
-    def _grubbs_test_for_mine(self, mine:str, alpha:float, side:str):
-        mine_data = self.df[mine].copy()
-        values = mine_data.to_numpy()
-        idx = mine_data.index
+        return self._get_outliers('Moving avarage distance', mine, (window, distance_percent_treshold), self._ma_mask)
 
+    # ---- grubbs test ----
+    def _grubbs_mask(self, columns, alpha:float, side:str):
         if side == 'max':
-            outliers_idx = smirnov_grubbs.max_test_indices(values, alpha)
+            sides = ['max']
         elif side == 'min':
-            outliers_idx = smirnov_grubbs.min_test_indices(values, alpha)
+            sides = ['min']
         elif side == 'both':
-            outliers_idx = sorted(set(
-                smirnov_grubbs.max_test_indices(values, alpha) +
-                smirnov_grubbs.min_test_indices(values, alpha)
-            ))
+            sides = ['max', 'min']
         else:
             raise ValueError('side must be: min, max or both')
-        out_idx = idx[outliers_idx]
-        outliers = self.df.loc[out_idx]
-        outliers['Mine'] = mine
-        return outliers
-    
+        mask = None
+        for s in sides:
+            order, g = self._grubbs_side(s)
+            order, g = order[:, columns], g[:, columns]
+            rank = np.arange(len(g))[:, None]
+            flagged = np.zeros(g.shape, dtype=bool)
+            np.put_along_axis(flagged, order, rank < grubbs_outlier_counts(g, alpha), axis=0)
+            mask = flagged if mask is None else mask | flagged
+        return mask
+
     def get_outliers_grubbs(self, mine=None, alpha:float=0.05, side:str='both'):
-        return self._aggregate_outliers(self._grubbs_test_for_mine, mine, alpha, side)
+        return self._get_outliers('Grubbs Test', mine, (alpha, side), self._grubbs_mask)
 
     def get_all_outliers_by_method(self, iqr_params:dict, z_params:dict, ma_params:dict, grubbs_params:dict):
         out_iqr = self.get_outliers_IQR(mine=None, **iqr_params)
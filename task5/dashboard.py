@@ -1,14 +1,21 @@
 import streamlit as st
 import pandas as pd
 import os
+import warnings
 from analysis import MineStatsAnalyzer
-from import_sheet import get_data
+from import_sheet import get_data, SNAPSHOT_TTL
 from visualize import get_chart
-from pdf_report import generate_pdf_report
+from pdf_report import stream_pdf_report, read_report
 import dashboard_default_values_config as conf
 from dotenv import load_dotenv 
 
 
+@st.cache_resource(max_entries=4)
+def get_analyzer(df: pd.DataFrame):
+    # kept across reruns so the analyzer's cached statistics and outlier masks survive widget changes
+    return MineStatsAnalyzer(df)
+
+
 def render_method_and_chart_selectors(analyzer: MineStatsAnalyzer):
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -98,7 +105,7 @@ def get_outliers_for_selection(analyzer: MineStatsAnalyzer,df: pd.DataFrame, met
     elif method == "Grubbs":
         return analyzer.get_outliers_grubbs(mine=mine, **params)
 
-    return df.iloc[0:0].copy()
+    return analyzer.get_empty_outliers(mine)
 
 def render_report_config_and_button(analyzer: MineStatsAnalyzer, df: pd.DataFrame):
     with st.expander("Generate PDF report"):
@@ -183,7 +190,12 @@ def render_report_config_and_button(analyzer: MineStatsAnalyzer, df: pd.DataFram
             }
             grubbs_params = {"alpha": alpha, "side": side}
 
-            pdf_bytes = generate_pdf_report(
+            progress_bar = st.progress(0.0, text="Rendering report...")
+
+            def report_progress(done: int, total: int):
+                progress_bar.progress(done / total, text=f"Rendering report: page {done}/{total}")
+
+            report_file = stream_pdf_report(
                 analyzer,
                 df,
                 iqr_params=iqr_params,
@@ -192,13 +204,23 @@ def render_report_config_and_button(analyzer: MineStatsAnalyzer, df: pd.DataFram
                 grubbs_params=grubbs_params,
                 chart_type=chart_type,
                 trend_degree=(None if trend_degree == 0 else trend_degree),
+                progress=report_progress,
             )
-
+            # the spooled file lives in the session until the next report replaces it
+            previous_report = st.session_state.get("report_file")
+            if previous_report is not None:
+                previous_report.close()
+            st.session_state["report_file"] = report_file
+
+            # deferred data: the report is only read when the download is clicked. Streamlit then
+            # copies the whole file into its in-memory media storage, so the spooled file only
+            # keeps the report out of memory until then
             st.download_button(
                 "Download report",
-                data=pdf_bytes,
+                data=lambda: read_report(report_file),
                 file_name="mine_analysis_report.pdf",
                 mime="application/pdf",
+                on_click="ignore",
             )
 
 import streamlit as st
@@ -284,12 +306,19 @@ def main():
     sheets_link = os.getenv('SHEETS_LINK')
     if not sheets_link:
         raise RuntimeError("SHEETS_LINK env var not set")
-    df = get_data(sheets_link)
-    analyzer = MineStatsAnalyzer(df)
+    ttl = float(os.getenv('SHEETS_CACHE_TTL', SNAPSHOT_TTL))
+    # Refresh sets the flag and reruns, so the sheet is revalidated before anything is drawn
+    with warnings.catch_warnings(record=True) as sheet_warnings:
+        warnings.simplefilter('always')
+        df = get_data(sheets_link, ttl=ttl, force_refresh=st.session_state.pop("refresh_sheet", False))
+    analyzer = get_analyzer(df)
 
     st.title("Weyland-Yutani Corporation mines dashboard")
+    for w in sheet_warnings:
+        st.warning(str(w.message))
     render_dashboard_intro()
     if st.button("🔄 Refresh"):
+        st.session_state["refresh_sheet"] = True
         st.rerun()
     st.subheader("Descriptive Statistics")
     st.table(analyzer.get_descriptive_statistics())
@@ -1,19 +1,126 @@
+import hashlib
+import io
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import warnings
+from collections import defaultdict
+import numpy as np
 import pandas as pd
 
-def import_data_from_google_sheets(url:str, tab:int):
+SNAPSHOT_DIR = './cache'
+# mine columns can be read as float32 to halve the frame size
+SHEET_FLOAT_DTYPE = 'float64'
+# seconds a snapshot is served without asking the server whether the sheet changed
+SNAPSHOT_TTL = 300
+
+# export url + float dtype -> {'df', 'etag', 'last_modified', 'checked_at'}
+_snapshots = {}
+
+
+def get_export_url(url:str, tab:int):
     url_clean, _ = url.rsplit('/', 1)
-    url_export = f'{url_clean}/export?format=csv&gid={tab}'
-    df = pd.read_csv(url_export)
-    return df
+    return f'{url_clean}/export?format=csv&gid={tab}'
 
-def preprocess_data(df:pd.DataFrame):
-    for col in df.columns:
-        if col == 'Date':
-            df[col] = pd.to_datetime(df[col])
-        else:
-            df[col] = df[col].str.replace(',', '.').astype(float)
-    df['total'] = df.sum(axis=1, numeric_only=True)
+def read_sheet_csv(source, float_dtype:str=SHEET_FLOAT_DTYPE):
+    # typed ingest: the parser turns decimal commas and dates into float and datetime64 columns directly,
+    # so no string copy of the mine columns is made
+    df = pd.read_csv(
+        source,
+        decimal=',',
+        parse_dates=['Date'],
+        dtype=defaultdict(lambda: float_dtype, Date='str'),
+    )
+    mines = [col for col in df.columns if col != 'Date']
+    # row-major pairwise sum over the parsed block, matching DataFrame.sum(axis=1)
+    values = np.ascontiguousarray(df[mines].to_numpy(dtype=np.float64))
+    df['total'] = np.nansum(values, axis=1).astype(float_dtype)
     return df
 
-def get_data(url:str, tab:int=31299030):
-    return preprocess_data(import_data_from_google_sheets(url,tab))
+# ---- Snapshots ----
+def get_snapshot_paths(key:str, snapshot_dir:str=SNAPSHOT_DIR):
+    base = os.path.join(snapshot_dir, hashlib.sha1(key.encode()).hexdigest())
+    return f'{base}.parquet', f'{base}.json'
+
+def read_snapshot(key:str, snapshot_dir:str=SNAPSHOT_DIR):
+    if key in _snapshots:
+        return _snapshots[key]
+    data_path, meta_path = get_snapshot_paths(key, snapshot_dir)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        snapshot = json.load(f)
+    snapshot['df'] = pd.read_parquet(data_path)
+    _snapshots[key] = snapshot
+    return snapshot
+
+def write_snapshot_meta(key:str, snapshot:dict, snapshot_dir:str=SNAPSHOT_DIR):
+    _, meta_path = get_snapshot_paths(key, snapshot_dir)
+    tmp_path = f'{meta_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({k: v for k, v in snapshot.items() if k != 'df'}, f)
+    os.replace(tmp_path, meta_path)
+
+def write_snapshot(key:str, snapshot:dict, snapshot_dir:str=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data_path, _ = get_snapshot_paths(key, snapshot_dir)
+    tmp_path = f'{data_path}.{os.getpid()}.tmp'
+    snapshot['df'].to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, data_path)
+    write_snapshot_meta(key, snapshot, snapshot_dir)
+    _snapshots[key] = snapshot
+
+def fetch_sheet_csv(url_export:str, snapshot:dict=None):
+    # returns (body, etag, last_modified); body is None when the server answers 304 Not Modified
+    request = urllib.request.Request(url_export)
+    if snapshot is not None:
+        if snapshot.get('etag'):
+            request.add_header('If-None-Match', snapshot['etag'])
+        if snapshot.get('last_modified'):
+            request.add_header('If-Modified-Since', snapshot['last_modified'])
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.read(), response.headers.get('ETag'), response.headers.get('Last-Modified')
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and snapshot is not None:
+            return None, snapshot.get('etag'), snapshot.get('last_modified')
+        raise
+
+def get_data(
+    url:str,
+    tab:int=31299030,
+    ttl:float=SNAPSHOT_TTL,
+    force_refresh:bool=False,
+    snapshot_dir:str=SNAPSHOT_DIR,
+    float_dtype:str=SHEET_FLOAT_DTYPE
+):
+    url_export = get_export_url(url, tab)
+    key = f'{url_export}#{float_dtype}'
+    snapshot = read_snapshot(key, snapshot_dir)
+    if snapshot is not None and not force_refresh and time.time() - snapshot['checked_at'] < ttl:
+        return snapshot['df'].copy()
+
+    try:
+        body, etag, last_modified = fetch_sheet_csv(url_export, snapshot)
+    except urllib.error.URLError as e:
+        # HTTPError is a URLError too; without a snapshot there is nothing to fall back to
+        if snapshot is None:
+            raise
+        # checked_at is left alone so the next call tries the server again
+        warnings.warn(f'could not revalidate the sheet ({e}), serving the snapshot checked at '
+                      f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["checked_at"]))}')
+        return snapshot['df'].copy()
+    if body is None:
+        snapshot['checked_at'] = time.time()
+        write_snapshot_meta(key, snapshot, snapshot_dir)
+    else:
+        snapshot = {
+            'df': read_sheet_csv(io.BytesIO(body), float_dtype),
+            'etag': etag,
+            'last_modified': last_modified,
+            'checked_at': time.time(),
+        }
+        write_snapshot(key, snapshot, snapshot_dir)
+    return snapshot['df'].copy()
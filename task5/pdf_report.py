@@ -1,11 +1,16 @@
 from matplotlib.backends.backend_pdf import PdfPages
 import matplotlib.pyplot as plt
 import io
-from analysis import MineStatsAnalyzer
-from visualize import get_chart
+import tempfile
+from analysis import MineStatsAnalyzer, OutlierResult
+from visualize import get_chart, ChartTemplate
 import pandas as pd
 import numpy as np
 
+DETAILS_ROWS_PER_PAGE = 25
+# streamed reports stay in memory up to this many bytes, then the spooled file moves to disk
+REPORT_SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
 def draw_table(ax, title:str, df:pd.DataFrame):
     ax.axis('off')
     ax.set_title(title, pad=20)
@@ -59,7 +64,7 @@ def generate_mine_overview_page(analyzer:MineStatsAnalyzer, outliers_by_method:d
     methods = list(outliers_by_method.keys())
     anomaly_counts = []
     for m in methods:
-        anomaly_counts.append(len(outliers_by_method[m][outliers_by_method[m]["Mine"] == mine]))
+        anomaly_counts.append(outliers_by_method[m].count(mine))
     fig, (ax_table, ax_bar) = plt.subplots(
         nrows=2,
         ncols=1,
@@ -71,12 +76,12 @@ def generate_mine_overview_page(analyzer:MineStatsAnalyzer, outliers_by_method:d
 
 def generate_anomaly_details_page(
     df: pd.DataFrame, 
-    df_outliers: pd.DataFrame,
+    outliers: OutlierResult,
     mine: str, 
     method_name: str, 
-    rows_per_page:int = 25
+    rows_per_page:int = DETAILS_ROWS_PER_PAGE
 ):
-    df_out = df_outliers[df_outliers["Mine"] == mine].copy()
+    df_out = df.iloc[outliers.get_positions(mine)][["Date", mine]]
     pages = []
     
     if df_out.empty:
@@ -86,8 +91,7 @@ def generate_anomaly_details_page(
         return pages    
     
     median_val = df[mine].median()
-    df_out["Type"] = np.where(df_out[mine] >= median_val, "Spike", "Drop")
-    table_df = df_out[["Date", mine, "Type"]].copy()
+    table_df = df_out.assign(Type=np.where(df_out[mine] >= median_val, "Spike", "Drop"))
     
     num_pages = (len(table_df) + rows_per_page - 1) // rows_per_page
     for page_idx in range(num_pages):
@@ -164,80 +168,179 @@ def generate_welcome_page(
 
 def generate_mine_method_chart_page(
     df: pd.DataFrame, 
-    outliers_df: pd.DataFrame, 
+    outliers: OutlierResult, 
     mine: str, 
     method_name: str, 
     chart_type: str, 
-    trend_degree: int
+    trend_degree: int,
+    template: ChartTemplate = None,
 ):    
-    fig = get_chart(
-        df,
-        outliers_df,
-        mine=mine,
-        chart_type=chart_type,
-        trend_degree=trend_degree,
-    )
+    if template is not None:
+        fig = template.draw(outliers)
+    else:
+        fig = get_chart(
+            df,
+            outliers,
+            mine=mine,
+            chart_type=chart_type,
+            trend_degree=trend_degree,
+        )
     fig.axes[0].set_title(f"{mine} – {method_name} ({chart_type}, deg={trend_degree})")
     return fig
 
-def generate_pdf_report(
+def iter_intro_pages(
     analyzer: MineStatsAnalyzer,
-    df: pd.DataFrame,
+    outliers_by_method: dict,
     iqr_params: dict,
     z_params: dict,
     ma_params: dict,
     grubbs_params: dict,
-    chart_type: str = "bar",
-    trend_degree: int = 2,
+    chart_type: str,
+    trend_degree: int,
 ):
-    mines = analyzer.get_all_mines()
-    outliers_by_method = analyzer.get_all_outliers_by_method(
+    yield generate_welcome_page(
         iqr_params=iqr_params,
         z_params=z_params,
         ma_params=ma_params,
         grubbs_params=grubbs_params,
+        chart_type=chart_type,
+        trend_degree=trend_degree,
     )
+    yield generate_summary_page(analyzer, outliers_by_method)
 
-    buffer = io.BytesIO()
-    with PdfPages(buffer) as pdf:
-        fig = generate_welcome_page(
-            iqr_params=iqr_params,
-            z_params=z_params,
-            ma_params=ma_params,
-            grubbs_params=grubbs_params,
+def iter_mine_pages(
+    analyzer: MineStatsAnalyzer,
+    df: pd.DataFrame,
+    outliers_by_method: dict,
+    mine: str,
+    chart_type: str,
+    trend_degree: int,
+):
+    yield generate_mine_overview_page(analyzer, outliers_by_method, mine)
+    # base series and trendline are drawn once per mine, each method only swaps the outliers
+    template = ChartTemplate(df, mine, chart_type, trend_degree)
+    for method_name, outliers in outliers_by_method.items():
+        yield generate_mine_method_chart_page(
+            df,
+            outliers,
+            mine,
+            method_name,
             chart_type=chart_type,
             trend_degree=trend_degree,
+            template=template,
         )
-        pdf.savefig(fig)
-        plt.close(fig)
+        yield from generate_anomaly_details_page(df, outliers, mine, method_name)
+
+def count_mine_pages(outliers_by_method: dict, mine: str, rows_per_page: int = DETAILS_ROWS_PER_PAGE):
+    # overview, then per method a chart and at least one details page
+    pages = 1
+    for outliers in outliers_by_method.values():
+        pages += 1 + max(1, -(-outliers.count(mine) // rows_per_page))
+    return pages
 
-        fig = generate_summary_page(analyzer, outliers_by_method)
+def save_pages(pdf: PdfPages, pages, page_done=None):
+    for fig in pages:
         pdf.savefig(fig)
         plt.close(fig)
+        if page_done is not None:
+            page_done(1)
 
+def write_pdf_report(
+    out_file,
+    analyzer: MineStatsAnalyzer,
+    df: pd.DataFrame,
+    iqr_params: dict,
+    z_params: dict,
+    ma_params: dict,
+    grubbs_params: dict,
+    chart_type: str = "bar",
+    trend_degree: int = 2,
+    progress=None,
+):
+    # pages go to out_file as they are produced; progress(done, total) is called after every saved page
+    mines = analyzer.get_all_mines()
+    outliers_by_method = analyzer.get_all_outliers_by_method(
+        iqr_params=iqr_params,
+        z_params=z_params,
+        ma_params=ma_params,
+        grubbs_params=grubbs_params,
+    )
+    intro_pages = iter_intro_pages(
+        analyzer,
+        outliers_by_method,
+        iqr_params,
+        z_params,
+        ma_params,
+        grubbs_params,
+        chart_type,
+        trend_degree,
+    )
+
+    total_pages = 2 + sum(count_mine_pages(outliers_by_method, mine) for mine in mines)
+    done_pages = 0
+    def page_done(pages: int):
+        nonlocal done_pages
+        done_pages += pages
+        if progress is not None:
+            progress(done_pages, total_pages)
+
+    with PdfPages(out_file) as pdf:
+        save_pages(pdf, intro_pages, page_done)
         for mine in mines:
-            fig = generate_mine_overview_page(analyzer, outliers_by_method, mine)
-            pdf.savefig(fig)
-            plt.close(fig)
-
-            for method_name, out_df in outliers_by_method.items():
-                fig = generate_mine_method_chart_page(
-                    df,
-                    out_df,
-                    mine,
-                    method_name,
-                    chart_type=chart_type,
-                    trend_degree=trend_degree,
-                )
-                pdf.savefig(fig)
-                plt.close(fig)
-
-                pages = generate_anomaly_details_page(df, out_df, mine, method_name)
-                for fig in pages:
-                    pdf.savefig(fig)
-                    plt.close(fig)
-
-    buffer.seek(0)
+            save_pages(pdf, iter_mine_pages(analyzer, df, outliers_by_method, mine, chart_type, trend_degree), page_done)
+
+def generate_pdf_report(
+    analyzer: MineStatsAnalyzer,
+    df: pd.DataFrame,
+    iqr_params: dict,
+    z_params: dict,
+    ma_params: dict,
+    grubbs_params: dict,
+    chart_type: str = "bar",
+    trend_degree: int = 2,
+):
+    buffer = io.BytesIO()
+    write_pdf_report(
+        buffer,
+        analyzer,
+        df,
+        iqr_params,
+        z_params,
+        ma_params,
+        grubbs_params,
+        chart_type=chart_type,
+        trend_degree=trend_degree,
+    )
     return buffer.getvalue()
 
+def stream_pdf_report(
+    analyzer: MineStatsAnalyzer,
+    df: pd.DataFrame,
+    iqr_params: dict,
+    z_params: dict,
+    ma_params: dict,
+    grubbs_params: dict,
+    chart_type: str = "bar",
+    trend_degree: int = 2,
+    progress=None,
+):
+    # returns the report as a rewound spooled temp file; the caller closes it
+    report_file = tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_MAX_SIZE)
+    write_pdf_report(
+        report_file,
+        analyzer,
+        df,
+        iqr_params,
+        z_params,
+        ma_params,
+        grubbs_params,
+        chart_type=chart_type,
+        trend_degree=trend_degree,
+        progress=progress,
+    )
+    report_file.seek(0)
+    return report_file
 
+def read_report(report_file):
+    report_file.seek(0)
+    return report_file.read()
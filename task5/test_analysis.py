@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from analysis import MineStatsAnalyzer
+
+smirnov_grubbs = pytest.importorskip('outliers.smirnov_grubbs')
+
+
+def make_mines():
+    rng = np.random.default_rng(0)
+    n_days = 200
+    mines = {}
+    base = rng.uniform(50, 200)
+    regular = base + rng.normal(0, base * 0.08, n_days)
+    idx = rng.choice(n_days, 12, replace=False)
+    regular[idx] *= rng.choice([0.3, 1.8], 12)
+    mines['Regular'] = regular
+    # large offset with a few huge spikes, where downdating running sums of squares loses the variance
+    offset = rng.normal(1e6, 0.01, n_days)
+    offset[rng.choice(n_days, 3, replace=False)] += 1e8
+    mines['Offset spikes'] = offset
+    # tight series with spikes of decreasing size, each removed spike leaves the variance of the rest
+    tight = rng.normal(10, 0.001, n_days)
+    tight[rng.choice(n_days, 4, replace=False)] = [1e9, 1e8, 1e7, 1e6]
+    mines['Tight spikes'] = tight
+    mines['Negative spikes'] = -tight
+    mines['Constant'] = np.full(n_days, 5.0)
+    return pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=n_days), **mines})
+
+
+# outlier-utils divides by a zero std on the constant mine
+@pytest.mark.filterwarnings('ignore:invalid value encountered:RuntimeWarning')
+@pytest.mark.parametrize('alpha', [0.05, 0.01])
+def test_grubbs_matches_outlier_utils(alpha):
+    df = make_mines()
+    analyzer = MineStatsAnalyzer(df)
+    for side, reference in [('max', smirnov_grubbs.max_test_indices), ('min', smirnov_grubbs.min_test_indices)]:
+        for mine in analyzer.get_all_mines():
+            result = analyzer.get_outliers_grubbs(mine=mine, alpha=alpha, side=side)
+            expected = sorted(reference(df[mine].to_numpy(), alpha=alpha))
+            assert list(np.flatnonzero(result.mask[:, 0])) == expected, (side, mine)
@@ -0,0 +1,109 @@
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import import_sheet
+
+
+def make_sheet_csv(n_days:int):
+    lines = ['Date,Mine A,Mine B']
+    for day in range(n_days):
+        lines.append(f'2024-01-{day + 1:02d},"{day},5","{2 * day},25"')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class SheetServer:
+    # stand-in for the Google Sheets export: serves an ETag and answers matching revalidations with 304
+    def __init__(self):
+        self.n_days = 10
+        self.responses = []
+        sheet = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                etag = f'"days-{sheet.n_days}"'
+                if self.headers.get('If-None-Match') == etag:
+                    sheet.responses.append(304)
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = make_sheet_csv(sheet.n_days)
+                sheet.responses.append(200)
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/spreadsheets/d/sheet/edit'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def sheet():
+    server = SheetServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture(autouse=True)
+def empty_snapshots(monkeypatch):
+    monkeypatch.setattr(import_sheet, '_snapshots', {})
+
+
+def test_snapshot_hits_misses_and_revalidation(sheet, tmp_path):
+    get = lambda **kwargs: import_sheet.get_data(sheet.url, snapshot_dir=str(tmp_path), **kwargs)
+
+    df = get(ttl=60)
+    assert sheet.responses == [200]
+    assert len(df) == 10
+    assert df['Mine A'].iloc[1] == 1.5
+    assert df['total'].iloc[1] == 1.5 + 2.25
+
+    # in-process hit
+    assert get(ttl=60).equals(df)
+    assert sheet.responses == [200]
+
+    # disk hit after the in-process copy is gone
+    import_sheet._snapshots.clear()
+    assert get(ttl=60).equals(df)
+    assert sheet.responses == [200]
+
+    # forced revalidation of an unchanged sheet
+    assert get(ttl=60, force_refresh=True).equals(df)
+    assert sheet.responses == [200, 304]
+
+    # a changed sheet is not seen while the snapshot is fresh
+    sheet.n_days = 12
+    assert len(get(ttl=60)) == 10
+    assert sheet.responses == [200, 304]
+
+    # once the ttl expires the new body is downloaded and stored
+    assert len(get(ttl=0)) == 12
+    assert sheet.responses == [200, 304, 200]
+    import_sheet._snapshots.clear()
+    assert len(get(ttl=60)) == 12
+    assert sheet.responses == [200, 304, 200]
+
+
+def test_stale_snapshot_served_when_revalidation_fails(sheet, tmp_path):
+    get = lambda: import_sheet.get_data(sheet.url, ttl=0, snapshot_dir=str(tmp_path))
+    df = get()
+    url = sheet.url
+    sheet.close()
+
+    with pytest.warns(UserWarning, match='could not revalidate'):
+        assert get().equals(df)
+
+    # a sheet that was never downloaded has no snapshot to fall back to
+    import_sheet._snapshots.clear()
+    with pytest.raises(urllib.error.URLError):
+        import_sheet.get_data(url, ttl=0, snapshot_dir=str(tmp_path / 'empty'))
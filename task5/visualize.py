@@ -1,16 +1,19 @@
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from cycler import cycler
 import pandas as pd
 import numpy as np
+from analysis import OutlierResult
 
 
 def prepare_series(df:pd.DataFrame, mine:str):
-    x_dates = df['Date'].copy()
+    x_dates = df['Date']
     x_numeric = np.arange(len(df))
-    y = df[mine].copy()
-    return df.copy(), x_dates, x_numeric, y
+    y = df[mine]
+    return df, x_dates, x_numeric, y
 
-def get_outliers_for_mine(df:pd.DataFrame, mine:str):
-    return df[df['Mine'] == mine].copy()
+def get_outliers_for_mine(outliers:OutlierResult, mine:str):
+    return outliers.get_mask(mine)
 
 def compute_trendline(x:np.ndarray, y:np.ndarray, degree:int):
     if degree == 0:
@@ -19,41 +22,60 @@ def compute_trendline(x:np.ndarray, y:np.ndarray, degree:int):
     return model(x)
 
 def apply_trendline(ax, x_dates, y):
-    ax.plot(x_dates, y, linestyle='--', color='red', linewidth=3, label = "Trendline")
+    return ax.plot(x_dates, y, linestyle='--', color='red', linewidth=3, label = "Trendline")[0]
 
-def apply_chart_by_type(ax, x_dates, y, df, df_outliers, chart_type, mine):
+def check_chart_type(chart_type):
+    if chart_type not in ('line', 'bar', 'stacked'):
+        raise ValueError('chart type must be: line, bar or stacked')
+
+def get_prop_cycle_from(offset:int):
+    props = plt.rcParams['axes.prop_cycle'].by_key()
+    return cycler(**{key: values[offset:] + values[:offset] for key, values in props.items()})
+
+def apply_base_series(ax, x_dates, y, chart_type, mine):
+    # the parts of a chart that do not depend on the outliers; stacked bars are all outlier dependent
     if chart_type == 'line':
         ax.plot(x_dates, y, label=mine)
-        if not df_outliers.empty:
-            ax.scatter(df_outliers['Date'], df_outliers[mine], label='Outliers')
     elif chart_type == 'bar':
         ax.bar(x_dates, y, width=1, label=mine)
-        if not df_outliers.empty:
-            ax.bar(df_outliers['Date'], df_outliers[mine], width=1, label='Outliers')
+
+def apply_outliers(ax, x_dates, y, df, is_outlier, chart_type, mine, moving_avg=None):
+    # returns the artists it adds so a template can remove them again
+    artists = []
+    if chart_type == 'line':
+        if is_outlier.any():
+            artists.append(ax.scatter(x_dates[is_outlier], y[is_outlier], label='Outliers'))
+    elif chart_type == 'bar':
+        if is_outlier.any():
+            artists.append(ax.bar(x_dates[is_outlier], y[is_outlier], width=1, label='Outliers'))
     elif chart_type == 'stacked':
-        is_outlier = df['Date'].isin(df_outliers['Date'])
-        moving_avg = df[mine].rolling(window=7, min_periods=1).mean().values
+        if moving_avg is None:
+            moving_avg = df[mine].rolling(window=7, min_periods=1).mean().values
         is_spike = is_outlier & (y > moving_avg)
         is_drop = is_outlier & (y < moving_avg)
 
         baseline = np.where(is_spike, moving_avg, y)
         spike_component = np.where(is_spike, y - moving_avg, 0.0)
         
-        ax.bar(x_dates, baseline, width=1.0, label="Baseline / normal")
-        ax.bar(x_dates, spike_component, bottom=baseline, width=1.0, label="Spike above 7d MA")
+        artists.append(ax.bar(x_dates, baseline, width=1.0, label="Baseline / normal"))
+        artists.append(ax.bar(x_dates, spike_component, bottom=baseline, width=1.0, label="Spike above 7d MA"))
         if is_drop.any():
-            ax.bar(x_dates[is_drop], y[is_drop], width=1.0, label="Drop vs 7d MA",linewidth=0.8)
-    else:
-        raise ValueError('chart type must be: line, bar or stacked')
+            artists.append(ax.bar(x_dates[is_drop], y[is_drop], width=1.0, label="Drop vs 7d MA",linewidth=0.8))
+    return artists
+
+def apply_chart_by_type(ax, x_dates, y, df, is_outlier, chart_type, mine):
+    check_chart_type(chart_type)
+    apply_base_series(ax, x_dates, y, chart_type, mine)
+    apply_outliers(ax, x_dates, y, df, is_outlier, chart_type, mine)
 
-def get_chart(df:pd.DataFrame, df_outliers:pd.DataFrame, mine:str, chart_type:str='line', trend_degree:int=0):
+def get_chart(df:pd.DataFrame, outliers:OutlierResult, mine:str, chart_type:str='line', trend_degree:int=0):
     df_plot, x_dates, x_numeric, y = prepare_series(df, mine)
-    df_out = get_outliers_for_mine(df_outliers, mine)
+    is_outlier = get_outliers_for_mine(outliers, mine)
     trend = compute_trendline(x_numeric, y, trend_degree)
     trend_text = ''
 
     fig, ax = plt.subplots(figsize=(16,8))
-    apply_chart_by_type(ax, x_dates, y, df_plot, df_out, chart_type, mine)
+    apply_chart_by_type(ax, x_dates, y, df_plot, is_outlier, chart_type, mine)
     if trend is not None:
         trend_text = f' + trend (polynomial of degree = {trend_degree})'
         apply_trendline(ax, x_dates, trend)
@@ -66,4 +88,54 @@ def get_chart(df:pd.DataFrame, df_outliers:pd.DataFrame, mine:str, chart_type:st
     fig.autofmt_xdate()
     # fig.tight_layout()
     return fig
-    
+
+
+class ChartTemplate:
+    # one mine's figure with the base series and trendline drawn once; draw() only swaps the outlier artists
+    def __init__(self, df:pd.DataFrame, mine:str, chart_type:str='line', trend_degree:int=0):
+        check_chart_type(chart_type)
+        self.df, self.x_dates, x_numeric, self.y = prepare_series(df, mine)
+        self.mine = mine
+        self.chart_type = chart_type
+        self.moving_avg = None
+        if chart_type == 'stacked':
+            self.moving_avg = df[mine].rolling(window=7, min_periods=1).mean().values
+        self.outlier_artists = []
+        # outliers get the colours they would get after the base series; only bar charts use one up
+        self.outlier_prop_cycle = get_prop_cycle_from(1 if chart_type == 'bar' else 0)
+
+        # not registered with pyplot, so closing pages after saving leaves it usable
+        self.fig = Figure(figsize=(16,8))
+        self.ax = self.fig.subplots()
+        apply_base_series(self.ax, self.x_dates, self.y, chart_type, mine)
+        trend = compute_trendline(x_numeric, self.y, trend_degree)
+        self.trend_line = None
+        self.trend_text = ''
+        if trend is not None:
+            self.trend_text = f' + trend (polynomial of degree = {trend_degree})'
+            self.trend_line = apply_trendline(self.ax, self.x_dates, trend)
+        self.ax.set_xlabel('Date')
+        self.ax.set_ylabel('Output')
+
+    def draw(self, outliers:OutlierResult):
+        for artist in self.outlier_artists:
+            artist.remove()
+        self.ax.set_prop_cycle(self.outlier_prop_cycle)
+        self.outlier_artists = apply_outliers(
+            self.ax,
+            self.x_dates,
+            self.y,
+            self.df,
+            get_outliers_for_mine(outliers, self.mine),
+            self.chart_type,
+            self.mine,
+            self.moving_avg
+        )
+        if self.trend_line is not None:
+            # re-added after the outliers to keep get_chart's artist and legend order
+            self.trend_line.remove()
+            self.ax.add_line(self.trend_line)
+        self.ax.set_title(f'{self.mine} - {self.chart_type} chart with outliers' + self.trend_text)
+        self.ax.legend()
+        self.fig.autofmt_xdate()
+        return self.fig